@@ -5,10 +5,220 @@
 """
 
 import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set
+
+from src.services.llm_engine_base import LLMExtractionResult
 from src.services.llm_engine_manager import LLMEngineManager
 from src.services.glm_engine import GLMEngine
 from src.services.deepseek_engine import DeepSeekEngine
 
+# 尝试导入 tiktoken（用于按实际token数选择引擎）
+try:
+    import tiktoken
+    _TOKEN_ENCODER = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _TOKEN_ENCODER = None
+
+
+# token计数缓存：内容哈希 -> token数（只保存哈希，不持有原文）
+_TOKEN_COUNT_CACHE_SIZE = 4096
+_token_count_cache: "OrderedDict[str, int]" = OrderedDict()
+
+
+def count_tokens(content: str) -> int:
+    """统计文本token数（按内容哈希缓存，重试、回退时无需重复编码）"""
+    content_hash = hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+    token_count = _token_count_cache.get(content_hash)
+    if token_count is None:
+        if _TOKEN_ENCODER is None:
+            # 未安装tiktoken时按字符数粗略估算（中文约1字符≈1 token）
+            token_count = len(content)
+        else:
+            token_count = len(_TOKEN_ENCODER.encode(content))
+        _token_count_cache[content_hash] = token_count
+        if len(_token_count_cache) > _TOKEN_COUNT_CACHE_SIZE:
+            _token_count_cache.popitem(last=False)
+    return token_count
+
+
+def ttl_cached(func: Callable[[], Any], seconds: float = 1.0) -> Callable[[], Any]:
+    """
+    为无参方法加上短时缓存：有效期内重复调用直接返回上次结果
+
+    适合轮询中反复调用、需要扫描历史指标的方法（如 get_optimization_suggestions）。
+    """
+    value = None
+    expires_at = 0.0
+
+    def wrapper():
+        nonlocal value, expires_at
+        now = time.monotonic()
+        if now >= expires_at:
+            value = func()
+            expires_at = now + seconds
+        return value
+
+    return wrapper
+
+
+class CachedLLMEngineManager:
+    """带持久化结果缓存的引擎管理器包装
+
+    以 (引擎, 模型, 系统提示, Schema, 内容, 温度) 的 SHA-256 作为键，
+    将抽取结果缓存为 JSON 文件。输入完全相同时直接返回缓存结果，零 token 成本。
+    """
+
+    def __init__(self, manager: LLMEngineManager, cache_dir: str = ".llm_cache"):
+        """初始化缓存包装
+
+        Args:
+            manager: 被包装的引擎管理器
+            cache_dir: 缓存目录
+        """
+        self.manager = manager
+        self.cache_dir = Path(cache_dir)
+
+    def __getattr__(self, name: str) -> Any:
+        # 其余属性和方法（register_engine、set_primary_engine等）透传给管理器
+        return getattr(self.manager, name)
+
+    def _cache_key(
+        self,
+        engine_name: Optional[str],
+        content: str,
+        json_schema: Dict[str, Any],
+        system_prompt: Optional[str],
+        temperature: float
+    ) -> str:
+        """计算缓存键"""
+        engine = self.manager.engines.get(engine_name) if engine_name else None
+        payload = {
+            "engine": engine_name,
+            "model": engine.model_name if engine else None,
+            "sys": system_prompt,
+            "schema": json_schema,
+            "content": content,
+            "temp": temperature
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cache_path(self, key: str) -> Path:
+        """缓存文件路径：按键前两位分桶，避免单目录文件过多"""
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _read_cache(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, path: Path, data: Dict[str, Any]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        # 原子替换，并发写入时不会读到半截文件
+        os.replace(tmp_path, path)
+
+    async def extract_with_schema(
+        self,
+        content: str,
+        json_schema: Dict[str, Any],
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.1,
+        **kwargs
+    ) -> LLMExtractionResult:
+        """结构化抽取（命中缓存时不发起网络请求）"""
+        engine_name = kwargs.get("primary_engine") or self.manager.primary_engine
+        key = self._cache_key(engine_name, content, json_schema, system_prompt, temperature)
+        path = self._cache_path(key)
+
+        cached = await asyncio.to_thread(self._read_cache, path)
+        if cached is not None:
+            return LLMExtractionResult(
+                success=True,
+                extracted_data=cached["extracted_data"],
+                confidence=cached.get("confidence", 0.9),
+                processing_time_ms=0.0,
+                model_used=cached.get("model_used"),
+                token_usage=cached.get("token_usage"),
+                cost_usd=0.0
+            )
+
+        result = await self.manager.extract_with_schema(
+            content=content,
+            json_schema=json_schema,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            **kwargs
+        )
+
+        # 只缓存成功结果，失败结果下次仍需重试
+        if result.success:
+            await asyncio.to_thread(self._write_cache, path, {
+                "extracted_data": result.extracted_data,
+                "confidence": result.confidence,
+                "model_used": result.model_used,
+                "token_usage": result.token_usage
+            })
+
+        return result
+
+
+class BudgetAlertLadder:
+    """分级预算告警（50% / 75% / 90% / 100%）
+
+    每个周期内每一级阈值只在首次越过时触发一次，避免重复告警；
+    100% 为硬停止线，触发后该周期内保持停止状态。
+    """
+
+    THRESHOLDS = (0.5, 0.75, 0.9, 1.0)
+    HARD_STOP = 1.0
+
+    def __init__(self):
+        self.alerted: Dict[str, Set[float]] = {"daily": set(), "monthly": set()}
+
+    def check(self, period: str, cost: float, budget: float) -> Optional[float]:
+        """检查是否越过新的告警阈值
+
+        Args:
+            period: 周期（daily / monthly）
+            cost: 当前周期成本
+            budget: 当前周期预算
+
+        Returns:
+            本次新越过的最高阈值，没有新越过的阈值时返回None
+        """
+        if budget <= 0:
+            return None
+
+        ratio = cost / budget
+        alerted = self.alerted[period]
+        fired = None
+        for threshold in self.THRESHOLDS:
+            if ratio < threshold:
+                break
+            if threshold not in alerted:
+                alerted.add(threshold)
+                fired = threshold
+        return fired
+
+    def is_hard_stopped(self, period: str) -> bool:
+        """当前周期是否已触达硬停止线"""
+        return self.HARD_STOP in self.alerted[period]
+
+    def reset(self, period: str) -> None:
+        """进入新周期时重置告警状态"""
+        self.alerted[period].clear()
+
 
 async def example_1_free_engine_for_development():
     """示例1：开发环境使用免费引擎"""
@@ -31,7 +241,8 @@ async def example_1_free_engine_for_development():
 
 async def example_2_cache_optimization():
     """示例2：利用DeepSeek缓存降低成本"""
-    manager = LLMEngineManager()
+    # 本地结果缓存：相同输入的重复调用直接返回，零成本
+    manager = CachedLLMEngineManager(LLMEngineManager())
     manager.register_engine(DeepSeekEngine())
 
     await manager.initialize_engines()
@@ -84,17 +295,27 @@ async def example_3_budget_control():
     manager.set_primary_engine("deepseek")
     manager.set_fallback_engine("glm")
 
-    # 处理请求前检查预算
-    if manager.cost_monitor.check_budget('daily'):
+    # 处理请求前检查预算：预计超出每日预算时切换到免费引擎
+    monitor = manager.cost_monitor
+
+    # 调用前预估本次成本（输入token + 输出token上限），避免单个大请求直接超出预算
+    content = "内容..."
+    max_output_tokens = 512
+    estimated_cost = manager.engines["deepseek"].calculate_cost(
+        count_tokens(content), max_output_tokens
+    )
+    within_budget = monitor.daily_cost + estimated_cost <= monitor.daily_budget_usd
+
+    if within_budget:
         result = await manager.extract_with_schema(
-            content="内容...",
+            content=content,
             json_schema={}
         )
     else:
-        print("⚠️ 每日预算已达上限，切换到免费引擎")
+        print(f"⚠️ 每日预算不足（预估本次 ${estimated_cost:.6f}），切换到免费引擎")
         manager.set_primary_engine("glm")
         result = await manager.extract_with_schema(
-            content="内容...",
+            content=content,
             json_schema={}
         )
 
@@ -112,10 +333,11 @@ async def example_4_engine_selection_by_scenario():
 
     # 根据任务特征选择引擎
     async def optimal_extract(content: str, schema: dict):
-        content_length = len(content)
+        # 按实际token数而非字符数路由（中文按字符计数会严重高估长度）
+        token_count = count_tokens(content)
 
         # 长文本：使用Kimi（支持128K上下文）
-        if content_length > 50000:
+        if token_count > 32000:
             print("使用Kimi引擎（长文本处理）")
             return await manager.extract_with_schema(
                 content=content,
@@ -125,7 +347,7 @@ async def example_4_engine_selection_by_scenario():
             )
 
         # 高频简单任务：使用GLM（免费）
-        elif content_length < 1000:
+        elif token_count < 400:
             print("使用GLM引擎（免费快速）")
             return await manager.extract_with_schema(
                 content=content,
@@ -160,28 +382,40 @@ async def example_5_cost_monitoring():
     await manager.initialize_engines()
     manager.set_primary_engine("deepseek")
 
-    # 设置告警阈值
-    manager.cost_monitor.alert_threshold = 0.8  # 80%时告警
+    # 分级告警：50% / 75% / 90% / 100%，每级只提醒一次
+    ladder = BudgetAlertLadder()
+
+    # 优化建议需要扫描历史指标，轮询时1秒内复用同一结果
+    optimization_suggestions = ttl_cached(manager.cost_monitor.get_optimization_suggestions)
 
     # 定期检查成本
     async def monitor_cost():
         monitor = manager.cost_monitor
 
+        # 各指标只读取一次，后续比较和告警文本复用同一组值
+        daily_cost = monitor.daily_cost
+        monthly_cost = monitor.monthly_cost
+        daily_budget = monitor.daily_budget_usd
+        monthly_budget = monitor.monthly_budget_usd
+
         # 每日成本检查
-        if monitor.daily_cost >= monitor.daily_budget_usd * monitor.alert_threshold:
-            print(f"⚠️ 每日成本告警: ${monitor.daily_cost:.2f} / ${monitor.daily_budget_usd}")
+        alert = ladder.check("daily", daily_cost, daily_budget)
+        if alert is not None:
+            print(f"⚠️ 每日成本已达预算{alert:.0%}: ${daily_cost:.2f} / ${daily_budget}")
             # 发送告警通知
             # send_alert(...)
 
-            # 自动切换到免费引擎
-            manager.set_primary_engine("glm")
+            # 达到硬停止线，自动切换到免费引擎
+            if ladder.is_hard_stopped("daily"):
+                manager.set_primary_engine("glm")
 
         # 每月成本检查
-        if monitor.monthly_cost >= monitor.monthly_budget_usd * monitor.alert_threshold:
-            print(f"⚠️ 每月成本告警: ${monitor.monthly_cost:.2f} / ${monitor.monthly_budget_usd}")
+        alert = ladder.check("monthly", monthly_cost, monthly_budget)
+        if alert is not None:
+            print(f"⚠️ 每月成本已达预算{alert:.0%}: ${monthly_cost:.2f} / ${monthly_budget}")
 
         # 获取优化建议
-        suggestions = monitor.get_optimization_suggestions()
+        suggestions = optimization_suggestions()
         if suggestions:
             print("\n💡 成本优化建议:")
             for suggestion in suggestions:
@@ -194,39 +428,58 @@ async def example_5_cost_monitoring():
 
 async def example_6_batch_cost_optimization():
     """示例6：批量处理成本优化"""
-    from asyncio import Semaphore
-
-    manager = LLMEngineManager()
+    manager = CachedLLMEngineManager(LLMEngineManager())
     manager.register_engine(DeepSeekEngine())
     manager.register_engine(GLMEngine())
 
     await manager.initialize_engines()
     manager.set_primary_engine("deepseek")
 
-    # 固定prompt（触发缓存）
+    # 固定prompt和schema（触发缓存；在循环外构建一次，引擎可直接复用已构建的前缀）
     FIXED_PROMPT = "你是一个专业的数据提取助手。"
-
-    # 限制并发（避免触发限流）
-    semaphore = Semaphore(10)
-
-    async def process_item(item):
-        async with semaphore:
-            return await manager.extract_with_schema(
-                content=item,
-                json_schema={},
-                system_prompt=FIXED_PROMPT  # 固定触发缓存
-            )
+    SCHEMA = {}
+
+    # 固定数量的worker从有界队列拉取任务（避免触发限流，且不为每个条目预先创建协程）
+    concurrency = 10
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    result_by_content = {}
+
+    # 每个结果在请求完成时即写入本地缓存（而非等整批结束），
+    # 批处理中途中断后重新运行，已完成的条目直接命中缓存，不再调用API
+    # 单个条目失败时记录异常，worker继续处理后续条目（否则worker退出后生产者会阻塞在满队列上）
+    async def worker():
+        while (item := await queue.get()) is not None:
+            try:
+                result_by_content[item] = await manager.extract_with_schema(
+                    content=item,
+                    json_schema=SCHEMA,
+                    system_prompt=FIXED_PROMPT  # 固定触发缓存
+                )
+            except Exception as e:
+                result_by_content[item] = e
 
     # 批量处理
     items = [f"内容{i}" for i in range(100)]
-    tasks = [process_item(item) for item in items]
-    results = await asyncio.gather(*tasks)
 
-    # 统计成本
-    total_cost = sum(r.cost_usd for r in results if r.success)
-    print(f"100个请求总成本: ${total_cost:.4f}")
-    print(f"平均每请求: ${total_cost/100:.6f}")
+    # 去重：相同内容只请求一次，结果回填给所有重复条目
+    unique_items = list(dict.fromkeys(items))
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    for item in unique_items:
+        await queue.put(item)  # 队列满时阻塞，形成背压
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
 
+    results = [result_by_content[item] for item in items]
+
+    # 统计成本（重复条目共享同一次调用，只计一次）
+    total_cost = sum(
+        r.cost_usd for r in result_by_content.values()
+        if not isinstance(r, Exception) and r.success
+    )
+    print(f"{len(items)}个条目（去重后{len(unique_items)}个请求）总成本: ${total_cost:.4f}")
+    print(f"平均每条目: ${total_cost/len(items):.6f}")
 
 if __name__ == "__main__":
     print("=== 示例1：开发环境使用免费引擎 ===")
@@ -149,7 +149,6 @@ async def dynamic_engine_switch_example():
 async def batch_processing_example():
     """批量处理示例"""
     import asyncio
-    from asyncio import Semaphore
 
     manager = LLMEngineManager()
     manager.register_engine(GLMEngine())
@@ -159,20 +158,32 @@ async def batch_processing_example():
     manager.set_primary_engine("deepseek")
     manager.set_fallback_engine("glm")
 
-    # 限制并发数
-    semaphore = Semaphore(10)
+    items = ["内容1", "内容2", "内容3", ...]
 
-    async def process_with_limit(item):
-        async with semaphore:
-            return await manager.extract_with_schema(
-                content=item,
-                json_schema={}
-            )
+    # 限制并发数：固定数量的worker从有界队列拉取任务
+    concurrency = 10
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    # 按下标写回，结果顺序与输入一致；单个条目失败时记录异常，不影响其他worker
+    results = [None] * len(items)
+
+    async def worker():
+        while (job := await queue.get()) is not None:
+            i, item = job
+            try:
+                results[i] = await manager.extract_with_schema(
+                    content=item,
+                    json_schema={}
+                )
+            except Exception as e:
+                results[i] = e
 
     # 并发处理
-    items = ["内容1", "内容2", "内容3", ...]
-    tasks = [process_with_limit(item) for item in items]
-    results = await asyncio.gather(*tasks)
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    for job in enumerate(items):
+        await queue.put(job)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
 
     return results
 
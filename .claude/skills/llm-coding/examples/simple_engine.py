@@ -4,12 +4,63 @@
 演示如何实现一个符合LLMEngineBase规范的简单引擎
 """
 
-from typing import Dict, Any, Optional, List
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Tuple
+
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter
+)
+
 from src.services.llm_engine_base import LLMEngineBase, LLMExtractionResult
 from src.core.logging import get_logger
 
 logger = get_logger(__name__)
 
+# 优先使用 orjson 解析响应（比标准库 json 更快），未安装时回退
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    import json
+    _json_loads = json.loads
+
+
+def _schema_fingerprint(schema: Dict[str, Any]) -> bytes:
+    """Schema内容指纹（键排序后序列化），用作缓存键
+
+    按内容而非对象身份缓存，调用方原地修改schema后不会命中旧结果。
+    """
+    if orjson is not None:
+        return orjson.dumps(schema, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(schema, sort_keys=True, ensure_ascii=False).encode("utf-8")
+
+EXTRACTION_OUTPUT_INSTRUCTIONS = """要求：
+1. 严格按照JSON Schema格式返回
+2. 只返回JSON对象，不要包含其他内容
+3. 如果某个字段无法提取，使用null
+4. 确保JSON格式正确
+"""
+
+
+@dataclass(frozen=True)
+class PrefixHandle:
+    """预先构建的静态Prompt前缀
+
+    同一批次中系统提示+Schema说明固定不变，只需构建一次，
+    所有条目复用同一个前缀消息块（远程引擎由服务端Prompt缓存命中KV）。
+    """
+    key: str
+    text: str
+    message: Dict[str, Any]
+
 
 class SimpleOpenAIEngine(LLMEngineBase):
     """简单的OpenAI兼容引擎实现
@@ -23,7 +74,8 @@ class SimpleOpenAIEngine(LLMEngineBase):
         base_url: Optional[str] = None,
         model_name: Optional[str] = None,
         timeout: int = 60,
-        max_retries: int = 2
+        max_retries: int = 5,
+        http_client: Optional[Any] = None
     ):
         """初始化引擎
 
@@ -32,7 +84,8 @@ class SimpleOpenAIEngine(LLMEngineBase):
             base_url: API基础URL
             model_name: 模型名称
             timeout: 请求超时时间（秒）
-            max_retries: 最大重试次数
+            max_retries: 最大重试次数（不含首次请求，由tenacity统一控制）
+            http_client: 共享的httpx.AsyncClient（可选），多个引擎/worker复用同一连接池
         """
         super().__init__(
             engine_name="simple_openai",
@@ -43,79 +96,127 @@ class SimpleOpenAIEngine(LLMEngineBase):
         self.base_url = base_url or "https://api.openai.com/v1"
         self.timeout = timeout
         self.max_retries = max_retries
+        self.http_client = http_client
+        self._owns_http_client = False
+        # 是否已有真实请求成功（首个请求兼作健康检查）
+        self._verified = False
 
         # 定价（示例：GPT-3.5-turbo）
         self.input_cost_per_1k = 0.0005
         self.output_cost_per_1k = 0.0015
 
+        # Prompt缓存计费系数（相对input_cost_per_1k）
+        self.cache_hit_cost_ratio = 0.1
+        self.cache_write_cost_ratio = 1.25
+        # 当前正在记录的请求的缓存用量，仅在record_request()执行期间非零
+        self._cache_usage: Tuple[int, int] = (0, 0)
+
         self.client = None
 
+        # 输入到前缀的快速映射：(system_prompt, schema指纹) -> PrefixHandle
+        self._prefix_lookup: OrderedDict = OrderedDict()
+        self._prefix_lookup_size = 256
+        # Schema说明缓存：schema指纹 -> 格式化后的说明
+        self._schema_desc_cache: OrderedDict = OrderedDict()
+
     async def initialize(self) -> bool:
         """初始化引擎"""
         try:
+            import httpx
             from openai import AsyncOpenAI
 
             if not self.api_key:
                 logger.warning("API key not provided")
                 return False
 
+            # 未传入共享连接池时自建一个：限制连接数，空闲连接超时后释放，
+            # 长时间运行（如成本监控轮询）时不会一直占用连接
+            if self.http_client is None:
+                self.http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=16,
+                        max_keepalive_connections=8,
+                        keepalive_expiry=30.0
+                    ),
+                    timeout=httpx.Timeout(self.timeout, connect=5.0)
+                )
+                self._owns_http_client = True
+
             self.client = AsyncOpenAI(
                 api_key=self.api_key,
                 base_url=self.base_url,
-                timeout=self.timeout
+                timeout=self.timeout,
+                http_client=self.http_client,
+                # 重试由_call_api_with_retry统一负责，关闭SDK内置重试，避免两层重试叠加
+                max_retries=0
             )
 
-            # 健康检查
-            is_healthy = await self.health_check()
-            if is_healthy:
-                self._enabled = True
-                self._initialized = True
-                logger.info(f"{self.engine_name} engine initialized")
+            # 不单独发送ping：第一次真实请求即作为健康检查，
+            # 若因认证/连接错误失败则在_check_first_request_failure中禁用引擎
+            self._enabled = True
+            self._initialized = True
+            self._verified = False
+            logger.info(f"{self.engine_name} engine initialized")
 
-            return is_healthy
+            return True
 
         except Exception as e:
             logger.error(f"Failed to initialize {self.engine_name}: {str(e)}")
             return False
 
+    async def close(self) -> None:
+        """释放引擎自建的HTTP连接池（共享连接池由调用方负责关闭）"""
+        if self._owns_http_client and self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+            self._owns_http_client = False
+
     async def extract_with_schema(
         self,
         content: str,
         json_schema: Dict[str, Any],
         system_prompt: Optional[str] = None,
         temperature: float = 0.1,
+        prefix_handle: Optional[PrefixHandle] = None,
         **kwargs
     ) -> LLMExtractionResult:
-        """使用JSON Schema进行结构化抽取"""
-        import time
-        import json
-        import asyncio
+        """使用JSON Schema进行结构化抽取
 
+        Args:
+            prefix_handle: prepare_prefix()返回的静态前缀，批量调用时传入可跳过前缀构建
+        """
         start_time = time.time()
 
         try:
-            # 构建Prompt
-            prompt = self._build_extraction_prompt(content, json_schema, system_prompt)
+            # 构建消息（静态前缀与动态内容分块，便于服务端Prompt缓存命中）
+            if prefix_handle is None:
+                prefix_handle = self._lookup_prefix(json_schema, system_prompt)
+            messages = self._build_extraction_messages(content, prefix_handle)
 
             # 调用API
             response = await self._call_api_with_retry(
-                prompt=prompt,
+                messages=messages,
                 temperature=temperature,
                 max_retries=self.max_retries
             )
 
             # 解析响应
             content_text = response.choices[0].message.content
-            extracted_data = json.loads(content_text)
+            extracted_data = _json_loads(content_text)
 
             processing_time = (time.time() - start_time) * 1000
 
-            # 记录指标
+            self._verified = True
+
+            # 记录指标（缓存命中/写入的token按折扣价计费）
+            cache_hit_tokens, cache_write_tokens = self._get_cache_usage(response.usage)
             cost = self.record_request(
                 input_tokens=response.usage.prompt_tokens,
                 output_tokens=response.usage.completion_tokens,
                 duration_ms=processing_time,
-                success=True
+                success=True,
+                cache_hit_tokens=cache_hit_tokens,
+                cache_write_tokens=cache_write_tokens
             )
 
             return LLMExtractionResult(
@@ -137,6 +238,7 @@ class SimpleOpenAIEngine(LLMEngineBase):
             logger.error(f"Extraction failed: {str(e)}")
 
             self.record_request(0, 0, processing_time, False, str(e))
+            self._check_first_request_failure(e)
 
             return LLMExtractionResult(
                 success=False,
@@ -153,8 +255,6 @@ class SimpleOpenAIEngine(LLMEngineBase):
         **kwargs
     ) -> LLMExtractionResult:
         """通用聊天补全"""
-        import time
-
         start_time = time.time()
 
         try:
@@ -167,6 +267,8 @@ class SimpleOpenAIEngine(LLMEngineBase):
 
             processing_time = (time.time() - start_time) * 1000
 
+            self._verified = True
+
             cost = self.record_request(
                 input_tokens=response.usage.prompt_tokens,
                 output_tokens=response.usage.completion_tokens,
@@ -192,6 +294,7 @@ class SimpleOpenAIEngine(LLMEngineBase):
             logger.error(f"Chat completion failed: {str(e)}")
 
             self.record_request(0, 0, processing_time, False, str(e))
+            self._check_first_request_failure(e)
 
             return LLMExtractionResult(
                 success=False,
@@ -200,6 +303,25 @@ class SimpleOpenAIEngine(LLMEngineBase):
                 processing_time_ms=processing_time
             )
 
+    def _check_first_request_failure(self, error: Exception) -> None:
+        """首个请求失败时判断引擎是否可用
+
+        认证失败、权限不足或无法连接说明引擎配置有误，直接禁用；
+        其他错误（如限流、内容解析失败）不影响引擎可用性。
+        """
+        if self._verified:
+            return
+
+        import openai
+
+        if isinstance(error, (
+            openai.AuthenticationError,
+            openai.PermissionDeniedError,
+            openai.APIConnectionError
+        )):
+            self._enabled = False
+            logger.error(f"{self.engine_name} disabled after first request failed: {str(error)}")
+
     async def health_check(self) -> bool:
         """健康检查"""
         try:
@@ -213,39 +335,179 @@ class SimpleOpenAIEngine(LLMEngineBase):
             logger.error(f"Health check failed: {str(e)}")
             return False
 
-    def calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
-        """计算请求成本（美元）"""
-        input_cost = (input_tokens / 1000) * self.input_cost_per_1k
+    def record_request(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        duration_ms: float,
+        success: bool,
+        error_message: Optional[str] = None,
+        cache_hit_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ) -> float:
+        """记录请求指标（缓存命中/写入的token按折扣价计费）
+
+        基类按calculate_cost(input_tokens, output_tokens)计费，这里在调用基类期间
+        带上本次请求的缓存用量，使指标中累计的成本与返回值一致。
+
+        Returns:
+            本次请求成本（美元）
+        """
+        self._cache_usage = (cache_hit_tokens, cache_write_tokens)
+        try:
+            return super().record_request(
+                input_tokens, output_tokens, duration_ms, success, error_message
+            )
+        finally:
+            self._cache_usage = (0, 0)
+
+    def calculate_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_hit_tokens: Optional[int] = None,
+        cache_write_tokens: Optional[int] = None
+    ) -> float:
+        """计算请求成本（美元）
+
+        Args:
+            input_tokens: 输入token数（包含缓存命中和缓存写入部分）
+            output_tokens: 输出token数
+            cache_hit_tokens: 命中Prompt缓存的输入token数（默认取record_request传入的值）
+            cache_write_tokens: 写入Prompt缓存的输入token数（默认取record_request传入的值）
+        """
+        if cache_hit_tokens is None:
+            cache_hit_tokens = self._cache_usage[0]
+        if cache_write_tokens is None:
+            cache_write_tokens = self._cache_usage[1]
+        uncached_tokens = max(input_tokens - cache_hit_tokens - cache_write_tokens, 0)
+        input_cost = (
+            uncached_tokens
+            + cache_hit_tokens * self.cache_hit_cost_ratio
+            + cache_write_tokens * self.cache_write_cost_ratio
+        ) / 1000 * self.input_cost_per_1k
         output_cost = (output_tokens / 1000) * self.output_cost_per_1k
         return input_cost + output_cost
 
-    def _build_extraction_prompt(
+    @staticmethod
+    def _get_cache_usage(usage: Any) -> Tuple[int, int]:
+        """读取Prompt缓存用量
+
+        兼容OpenAI（prompt_tokens_details.cached_tokens）、DeepSeek（prompt_cache_hit_tokens）
+        和Anthropic风格（cache_read_input_tokens / cache_creation_input_tokens）的字段。
+
+        Returns:
+            (缓存命中token数, 缓存写入token数)
+        """
+        details = getattr(usage, "prompt_tokens_details", None)
+        cache_hit = (
+            getattr(details, "cached_tokens", None)
+            or getattr(usage, "prompt_cache_hit_tokens", None)
+            or getattr(usage, "cache_read_input_tokens", None)
+            or 0
+        )
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        return cache_hit, cache_write
+
+    def prepare_prefix(
         self,
-        content: str,
         schema: Dict[str, Any],
         system_prompt: Optional[str] = None
-    ) -> str:
-        """构建抽取Prompt"""
+    ) -> PrefixHandle:
+        """构建静态Prompt前缀
+
+        固定的系统提示+Schema说明放在system消息中并标记为可缓存。
+        批量调用前构建一次并传给extract_with_schema；未传入时由_lookup_prefix按输入缓存。
+
+        Args:
+            schema: JSON Schema
+            system_prompt: 系统提示词
+
+        Returns:
+            PrefixHandle: 可在多次extract_with_schema调用间复用的前缀
+        """
         default_system = "你是一个专业的数据提取助手，请从文本中提取结构化信息。"
         final_system = system_prompt or default_system
 
-        schema_desc = self._format_schema_description(schema)
+        schema_desc = self._get_schema_description(schema)
 
-        return f"""{final_system}
+        static_prefix = f"""{final_system}
 
 请从以下文本中提取信息，按照JSON Schema格式返回：
 
-{schema_desc}
+{schema_desc}"""
+
+        return PrefixHandle(
+            key=hashlib.sha256(static_prefix.encode("utf-8")).hexdigest(),
+            text=static_prefix,
+            message={
+                "role": "system",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": static_prefix,
+                        "cache_control": {"type": "ephemeral"}
+                    }
+                ]
+            }
+        )
 
-待提取文本：
-{content}
+    def _lookup_prefix(
+        self,
+        schema: Dict[str, Any],
+        system_prompt: Optional[str] = None
+    ) -> PrefixHandle:
+        """按(system_prompt, schema内容)查找已构建的前缀
 
-要求：
-1. 严格按照JSON Schema格式返回
-2. 只返回JSON对象，不要包含其他内容
-3. 如果某个字段无法提取，使用null
-4. 确保JSON格式正确
-"""
+        批量调用时system_prompt和schema通常保持不变，命中后直接复用前缀，
+        不再重复格式化Schema和拼接字符串。
+        """
+        lookup_key = (system_prompt, _schema_fingerprint(schema))
+        handle = self._prefix_lookup.get(lookup_key)
+        if handle is not None:
+            self._prefix_lookup.move_to_end(lookup_key)
+            return handle
+
+        handle = self.prepare_prefix(schema, system_prompt)
+        self._prefix_lookup[lookup_key] = handle
+        if len(self._prefix_lookup) > self._prefix_lookup_size:
+            self._prefix_lookup.popitem(last=False)
+        return handle
+
+    def _build_extraction_messages(
+        self,
+        content: str,
+        prefix_handle: PrefixHandle
+    ) -> List[Dict[str, Any]]:
+        """构建抽取消息
+
+        静态前缀复用prefix_handle中的system消息，
+        每次变化的待提取文本和输出要求放在user消息中。
+        """
+        return [
+            prefix_handle.message,
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": f"待提取文本：\n{content}"},
+                    {"type": "text", "text": EXTRACTION_OUTPUT_INSTRUCTIONS}
+                ]
+            }
+        ]
+
+    def _get_schema_description(self, schema: Dict[str, Any]) -> str:
+        """获取Schema说明（内容相同的schema只格式化一次）"""
+        key = _schema_fingerprint(schema)
+        schema_desc = self._schema_desc_cache.get(key)
+        if schema_desc is not None:
+            self._schema_desc_cache.move_to_end(key)
+            return schema_desc
+
+        schema_desc = self._format_schema_description(schema)
+        self._schema_desc_cache[key] = schema_desc
+        if len(self._schema_desc_cache) > self._prefix_lookup_size:
+            self._schema_desc_cache.popitem(last=False)
+        return schema_desc
 
     def _format_schema_description(self, schema: Dict[str, Any]) -> str:
         """格式化Schema描述"""
@@ -266,43 +528,39 @@ class SimpleOpenAIEngine(LLMEngineBase):
 
     async def _call_api_with_retry(
         self,
-        prompt: str,
+        messages: List[Dict[str, Any]],
         temperature: float,
         max_retries: int
     ):
-        """带重试的API调用"""
-        import asyncio
-
-        last_exception = None
+        """带重试的API调用
 
-        for attempt in range(max_retries + 1):
-            try:
-                response = await asyncio.wait_for(
+        指数退避 + 随机抖动（初始1秒，倍数2.0，上限30秒），
+        避免多个并发worker在限流后同时重试。只重试超时、限流、连接等临时性错误。
+        """
+        import openai
+
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(max_retries + 1),
+            wait=wait_exponential_jitter(initial=1, max=30, exp_base=2),
+            retry=retry_if_exception_type((
+                asyncio.TimeoutError,
+                openai.RateLimitError,
+                openai.APIConnectionError,
+                openai.InternalServerError
+            )),
+            before_sleep=lambda state: logger.warning(
+                "API error, retrying (%s/%s): %r",
+                state.attempt_number, max_retries, state.outcome.exception()
+            ),
+            reraise=True
+        ):
+            with attempt:
+                return await asyncio.wait_for(
                     self.client.chat.completions.create(
                         model=self.model_name,
-                        messages=[{"role": "user", "content": prompt}],
+                        messages=messages,
                         temperature=temperature,
                         response_format={"type": "json_object"}
                     ),
                     timeout=self.timeout
                 )
-
-                return response
-
-            except asyncio.TimeoutError:
-                last_exception = Exception(f"Timeout after {self.timeout}s")
-                if attempt < max_retries:
-                    wait_time = 1 * (attempt + 1)
-                    logger.warning(f"Timeout, retrying in {wait_time}s")
-                    await asyncio.sleep(wait_time)
-                    continue
-
-            except Exception as e:
-                last_exception = e
-                if attempt < max_retries:
-                    wait_time = 1 * (attempt + 1)
-                    logger.warning(f"API error, retrying: {str(e)}")
-                    await asyncio.sleep(wait_time)
-                    continue
-
-        raise last_exception
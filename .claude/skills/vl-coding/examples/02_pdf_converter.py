@@ -4,6 +4,7 @@
 """
 
 import asyncio
+import logging
 from pathlib import Path
 from pdf_converter import VLPDFConverter
 from vl_engine_glm import GLMVLEngine
@@ -56,6 +57,8 @@ async def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     print("=" * 60)
     print("PDF 转 Markdown 示例")
     print("=" * 60)
@@ -4,6 +4,7 @@
 """
 
 import asyncio
+import logging
 from vl_engine_manager import VLEngineManager
 from vl_engine_glm import GLMVLEngine
 from vl_engine_openai import OpenAIVLEngine
@@ -76,6 +77,8 @@ async def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     print("=" * 60)
     print("多引擎故障转移示例")
     print("=" * 60)
@@ -4,11 +4,49 @@
 """
 
 import asyncio
+import logging
+import queue
+import sys
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from pdf_converter import VLPDFConverter
+from pdf_converter import PYMUPDF_AVAILABLE, VLPDFConverter, fitz, shutdown_raster_pool
 from vl_engine_glm import GLMVLEngine
 from vl_engine_manager import VLEngineManager
 
+logger = logging.getLogger(__name__)
+
+# 无法读取页数时，按平均每页字节数把文件大小折算为页数
+BYTES_PER_PAGE_ESTIMATE = 100 * 1024
+
+
+@contextmanager
+def queued_logging():
+    """
+    批量处理期间将日志经队列交给后台线程输出
+
+    协程只把日志记录放入队列，不再争用 stdout 锁；结束后恰好恢复进入前的处理器。
+    """
+    root = logging.getLogger()
+    original_handlers = root.handlers[:]
+    # 原本没有处理器时临时输出到 stdout，退出后不保留
+    handlers = original_handlers or [logging.StreamHandler(sys.stdout)]
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = QueueHandler(log_queue)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    for handler in original_handlers:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    listener.start()
+    try:
+        yield
+    finally:
+        listener.stop()
+        root.removeHandler(queue_handler)
+        for handler in original_handlers:
+            root.addHandler(handler)
+
 
 class BatchProcessor:
     """批量处理器"""
@@ -20,9 +58,26 @@ class BatchProcessor:
         Args:
             max_concurrent: 最大并发数
         """
+        self.max_concurrent = max_concurrent
         self.semaphore = asyncio.Semaphore(max_concurrent)
         self.converter = None
 
+    @staticmethod
+    def _estimate_work(pdf_path: Path) -> int:
+        """
+        估算 PDF 的页数，用于排序
+
+        PyMuPDF 打开文档只读取交叉引用表，可以廉价获得页数；否则按文件大小折算，
+        两种情况使用同一单位，排序结果可比。
+        """
+        if PYMUPDF_AVAILABLE:
+            try:
+                with fitz.open(str(pdf_path)) as pdf_document:
+                    return pdf_document.page_count
+            except Exception:
+                pass
+        return max(1, pdf_path.stat().st_size // BYTES_PER_PAGE_ESTIMATE)
+
     async def process_single_pdf(self, pdf_path: Path, output_dir: Path):
         """
         处理单个 PDF
@@ -34,24 +89,28 @@ class BatchProcessor:
         Returns:
             处理结果
         """
+        output_path = output_dir / f"{pdf_path.stem}.md"
+
         async with self.semaphore:
             try:
-                print(f"\n开始处理: {pdf_path.name}")
+                logger.info("开始处理: %s", pdf_path.name)
 
-                result = await self.converter.convert_pdf_to_markdown(
-                    pdf_path=pdf_path,
-                    job_id=f"batch_{pdf_path.stem}",
-                    document_id=pdf_path.stem
-                )
-
-                # 保存结果
-                output_path = output_dir / f"{pdf_path.stem}.md"
-                output_path.write_text(result["markdown"], encoding="utf-8")
+                # 每页完成后立即写入输出文件（1 MiB 缓冲），内存中不保留全文
+                with output_path.open("w", encoding="utf-8", buffering=1 << 20) as f:
+                    result = await self.converter.convert_pdf_to_markdown(
+                        pdf_path=pdf_path,
+                        job_id=f"batch_{pdf_path.stem}",
+                        document_id=pdf_path.stem,
+                        output_stream=f
+                    )
 
                 metadata = result["metadata"]
-                print(f"✓ 完成: {pdf_path.name}")
-                print(f"  页数: {metadata['page_count']}")
-                print(f"  成功率: {metadata['success_pages']/metadata['page_count']*100:.1f}%")
+                logger.info(
+                    "✓ 完成: %s（页数: %d，成功率: %.1f%%）",
+                    pdf_path.name,
+                    metadata["page_count"],
+                    metadata["success_pages"] / metadata["page_count"] * 100
+                )
 
                 return {
                     "file": pdf_path.name,
@@ -60,7 +119,9 @@ class BatchProcessor:
                 }
 
             except Exception as e:
-                print(f"✗ 失败: {pdf_path.name} - {str(e)}")
+                # 删除写了一半的输出文件
+                output_path.unlink(missing_ok=True)
+                logger.error("✗ 失败: %s - %s", pdf_path.name, e)
                 return {
                     "file": pdf_path.name,
                     "success": False,
@@ -78,8 +139,10 @@ class BatchProcessor:
         # 创建输出目录
         output_dir.mkdir(exist_ok=True)
 
-        # 获取所有 PDF 文件
+        # 获取所有 PDF 文件，按处理量从大到小排序（最长任务优先，减少批次尾部空等）
         pdf_files = list(pdf_dir.glob("*.pdf"))
+        work = await asyncio.to_thread(lambda: {p: self._estimate_work(p) for p in pdf_files})
+        pdf_files.sort(key=work.__getitem__, reverse=True)
 
         if not pdf_files:
             print(f"✗ 在 {pdf_dir} 中未找到 PDF 文件")
@@ -93,15 +156,27 @@ class BatchProcessor:
         manager.register_engine(glm_engine)
         manager.set_primary_engine("glm")
 
+        # 引擎只初始化一次，所有文件共享同一客户端和连接池
+        if not await manager.initialize_engines():
+            print("✗ 无法初始化任何 VL 引擎")
+            return
+
         self.converter = VLPDFConverter(vl_manager=manager)
 
-        # 并发处理
-        tasks = [
-            self.process_single_pdf(pdf, output_dir)
-            for pdf in pdf_files
-        ]
+        # 并发处理：max_concurrent 个 worker 按顺序领取文件，不预先为每个文件创建任务
+        pending = iter(pdf_files)
+        results = []
 
-        results = await asyncio.gather(*tasks)
+        async def worker():
+            for pdf in pending:
+                results.append(await self.process_single_pdf(pdf, output_dir))
+
+        try:
+            with queued_logging():
+                await asyncio.gather(*(worker() for _ in range(self.max_concurrent)))
+        finally:
+            await manager.close()
+            await asyncio.to_thread(shutdown_raster_pool)
 
         # 统计结果
         success_count = sum(1 for r in results if r["success"])
@@ -134,6 +209,8 @@ async def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     print("=" * 60)
     print("PDF 批量处理示例")
     print("=" * 60)
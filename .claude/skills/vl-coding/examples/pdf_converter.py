@@ -3,18 +3,25 @@ PDF 转 Markdown 转换器
 使用 VL 引擎将 PDF 文档转换为 Markdown 格式
 """
 
+import asyncio
+import io
+import logging
+import multiprocessing
 import os
 import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import IO, Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 
 # 尝试导入 PDF 转图片库
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
     PDF2IMAGE_AVAILABLE = True
 except ImportError:
     PDF2IMAGE_AVAILABLE = False
     convert_from_path = None
+    pdfinfo_from_path = None
 
 try:
     import fitz  # PyMuPDF
@@ -25,27 +32,210 @@ except ImportError:
 
 from vl_engine_manager import VLEngineManager
 
+logger = logging.getLogger(__name__)
+
+# PDF 转图片默认参数（VL 模型识别文字超过 150 DPI 基本无收益）
+DEFAULT_TARGET_DPI = 150
+DEFAULT_JPEG_QUALITY = 82
+# 文本层字符数达到该值的页面直接使用原生文本，跳过 VL
+DEFAULT_NATIVE_TEXT_MIN_CHARS = 200
+# 空白页判定：按步长抽样像素，标准差（0-255）低于阈值视为空白
+BLANK_PAGE_SAMPLE_STRIDE = 64
+BLANK_PAGE_MAX_STDDEV = 3.0
+
+# PDF 转图片进程池（首次使用时创建，所有转换器共享）
+RASTER_MAX_WORKERS = min(4, os.cpu_count() or 1)
+_RASTER_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _get_raster_pool() -> ProcessPoolExecutor:
+    """获取 PDF 转图片进程池"""
+    global _RASTER_POOL
+    if _RASTER_POOL is None:
+        # 部分 MuPDF 构建在 fork 后不安全，统一使用 spawn
+        _RASTER_POOL = ProcessPoolExecutor(
+            max_workers=RASTER_MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _RASTER_POOL
+
+
+def shutdown_raster_pool() -> None:
+    """
+    关闭 PDF 转图片进程池
+
+    worker 进程退出时释放其缓存的已打开文档（及文件句柄）；之后再转换会重新创建进程池。
+    """
+    global _RASTER_POOL
+    if _RASTER_POOL is not None:
+        _RASTER_POOL.shutdown()
+        _RASTER_POOL = None
+
+
+# 进程池 worker 内已打开的 PyMuPDF 文档（LRU），同一 PDF 的后续分块无需重新解析
+OPEN_DOCUMENT_CACHE_SIZE = 2
+_OPEN_DOCUMENTS: "OrderedDict[Tuple[str, int, int], Any]" = OrderedDict()
+
+
+def _open_pdf_document(pdf_path: str) -> Any:
+    """
+    获取已打开的 PyMuPDF 文档，未命中时打开并缓存
+
+    以 (路径, 修改时间, 大小) 为键，文件被替换后会重新打开。
+    """
+    stat = os.stat(pdf_path)
+    key = (pdf_path, stat.st_mtime_ns, stat.st_size)
+
+    pdf_document = _OPEN_DOCUMENTS.get(key)
+    if pdf_document is not None:
+        _OPEN_DOCUMENTS.move_to_end(key)
+        return pdf_document
+
+    pdf_document = fitz.open(pdf_path)
+    _OPEN_DOCUMENTS[key] = pdf_document
+    if len(_OPEN_DOCUMENTS) > OPEN_DOCUMENT_CACHE_SIZE:
+        _, evicted = _OPEN_DOCUMENTS.popitem(last=False)
+        evicted.close()
+    return pdf_document
+
+
+def _is_blank_pixmap(pix: Any) -> bool:
+    """按步长抽样像素，判断页面是否近乎空白"""
+    samples = pix.samples_mv[::BLANK_PAGE_SAMPLE_STRIDE]
+    n = len(samples)
+    if n == 0:
+        return True
+    mean = sum(samples) / n
+    variance = sum(x * x for x in samples) / n - mean * mean
+    return variance < BLANK_PAGE_MAX_STDDEV ** 2
+
+
+def _render_pdf_chunk(
+    pdf_path: str,
+    first_page: int,
+    last_page: int,
+    out_dir: str,
+    target_dpi: int,
+    jpeg_quality: int,
+    native_text_min_chars: Optional[int],
+    skip_blank_pages: bool
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    将 PDF 的一块页面转换为图片（在进程池中执行）
+
+    Args:
+        pdf_path: PDF 文件路径
+        first_page: 起始页码（从 1 开始，含）
+        last_page: 结束页码（含）
+        out_dir: 图片输出目录（调用方负责清理）
+        target_dpi: 渲染 DPI
+        jpeg_quality: JPEG 质量
+        native_text_min_chars: 文本层字符数达到该值时不渲染图片（None 表示总是渲染）
+        skip_blank_pages: 是否跳过空白页（仅 PyMuPDF）
+
+    Returns:
+        每页一个 (图片文件路径, 原生文本) 元组，二者恰有一个不为 None；
+        空白页为 (None, "")
+    """
+    try:
+        # 优先使用 PyMuPDF：进程内渲染，无需 fork pdftoppm
+        if PYMUPDF_AVAILABLE:
+            zoom = target_dpi / 72
+            mat = fitz.Matrix(zoom, zoom)
+            pages = []
+
+            pdf_document = _open_pdf_document(pdf_path)
+            for page in pdf_document.pages(first_page - 1, last_page):
+                text = ""
+                if native_text_min_chars is not None or skip_blank_pages:
+                    text = page.get_text("text").strip()
+
+                # 原生 PDF 页面已有文本层，无需 VL 识别
+                if native_text_min_chars is not None and len(text) >= native_text_min_chars:
+                    pages.append((None, text))
+                    continue
+
+                pix = page.get_pixmap(matrix=mat, alpha=False, colorspace=fitz.csRGB)
+
+                # 无文本层且像素近乎一致的空白页不写图片，也不调用 VL
+                if skip_blank_pages and not text and _is_blank_pixmap(pix):
+                    pages.append((None, ""))
+                    continue
+
+                jpeg = pix.tobytes("jpeg", jpg_quality=jpeg_quality)
+                pix = None
+
+                image_path = os.path.join(out_dir, f"p{page.number + 1:05d}.jpg")
+                with open(image_path, "wb") as f:
+                    f.write(jpeg)
+                pages.append((image_path, None))
+
+            return pages
+
+        # 回退到 pdf2image，图片直接写入输出目录
+        if PDF2IMAGE_AVAILABLE:
+            paths = convert_from_path(
+                pdf_path,
+                dpi=target_dpi,
+                fmt="jpeg",
+                jpegopt={"quality": jpeg_quality, "progressive": False, "optimize": False},
+                thread_count=4,
+                first_page=first_page,
+                last_page=last_page,
+                output_folder=out_dir,
+                paths_only=True
+            )
+            return [(path, None) for path in paths]
+
+        raise RuntimeError("没有可用的 PDF 转图片工具")
+
+    except Exception as e:
+        # 已写出的图片由调用方的临时目录统一清理
+        raise RuntimeError(f"PDF 转图片失败: {str(e)}") from e
+
 
 class VLPDFConverter:
     """VL PDF 转 Markdown 转换器"""
 
-    def __init__(self, vl_manager: VLEngineManager = None):
+    def __init__(
+        self,
+        vl_manager: VLEngineManager = None,
+        max_concurrent_pages: int = 4,
+        target_dpi: int = DEFAULT_TARGET_DPI,
+        jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+        native_text_min_chars: Optional[int] = DEFAULT_NATIVE_TEXT_MIN_CHARS,
+        skip_blank_pages: bool = True
+    ):
         """
         初始化转换器
 
         Args:
             vl_manager: VL 引擎管理器（如未提供则创建新的）
+            max_concurrent_pages: 单个 PDF 同时分析的最大页数
+            target_dpi: 页面渲染 DPI
+            jpeg_quality: 页面图片 JPEG 质量
+            native_text_min_chars: 文本层字符数达到该值的页面直接使用原生文本
+                （仅 PyMuPDF 可用；None 表示所有页面都走 VL）
+            skip_blank_pages: 是否跳过空白页（仅 PyMuPDF 可用）
         """
         self.vl_manager = vl_manager or VLEngineManager()
+        self.max_concurrent_pages = max_concurrent_pages
+        self.target_dpi = target_dpi
+        self.jpeg_quality = jpeg_quality
+        self.native_text_min_chars = native_text_min_chars
+        self.skip_blank_pages = skip_blank_pages
+        # 默认提示词只构建一次
+        self._default_prompt = self._build_default_prompt()
+        # 限制同时提交到进程池的转换任务数
+        self._raster_semaphore = asyncio.Semaphore(RASTER_MAX_WORKERS)
 
         # 检查依赖
         if not PDF2IMAGE_AVAILABLE and not PYMUPDF_AVAILABLE:
-            print("⚠️  警告: pdf2image 和 PyMuPDF 都未安装")
-            print("   请运行: pip install pdf2image")
-        elif PDF2IMAGE_AVAILABLE:
-            print("✓ 使用 pdf2image 进行 PDF 转换")
+            logger.warning("⚠️  警告: PyMuPDF 和 pdf2image 都未安装，请运行: pip install PyMuPDF")
+        elif PYMUPDF_AVAILABLE:
+            logger.info("✓ 使用 PyMuPDF 进行 PDF 转换")
         else:
-            print("✓ 使用 PyMuPDF 进行 PDF 转换")
+            logger.info("✓ 使用 pdf2image 进行 PDF 转换")
 
     async def convert_pdf_to_markdown(
         self,
@@ -53,6 +243,7 @@ class VLPDFConverter:
         job_id: str,
         document_id: str,
         analysis_prompt: str = None,
+        output_stream: Optional[IO[str]] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
@@ -63,112 +254,81 @@ class VLPDFConverter:
             job_id: 作业 ID
             document_id: 文档 ID
             analysis_prompt: 自定义分析提示词
+            output_stream: Markdown 输出流；提供时每页完成后按页序立即写出，
+                结果中的 markdown / raw_text 为 None，pages 不含页面文本
             **kwargs: 其他参数
 
         Returns:
             转换结果字典
         """
-        print(f"\n开始处理 PDF: {pdf_path}")
+        logger.info("开始处理 PDF: %s", pdf_path)
 
         try:
-            # 1. 初始化 VL 引擎
+            # 1. 初始化 VL 引擎（已初始化时立即返回）
             if not await self.vl_manager.initialize_engines():
                 raise RuntimeError("无法初始化任何 VL 引擎")
 
-            # 2. 将 PDF 转换为图片
-            print("正在将 PDF 转换为图片...")
-            images = self._pdf_to_images(pdf_path)
-            if not images:
-                raise RuntimeError("PDF 转图片失败")
+            # 2. 获取页数
+            total_pages = await asyncio.to_thread(self._get_page_count, pdf_path)
+            if not total_pages:
+                raise RuntimeError("PDF 转图片失败: 未检测到页面")
 
-            print(f"✓ PDF 已转换为 {len(images)} 张图片")
+            logger.info("✓ PDF 共 %d 页，开始边转换边分析", total_pages)
 
-            # 3. 使用 VL 引擎分析每张图片
+            # 3. 按页序接收完成的页面，一次遍历完成统计、Markdown 和原始文本
             pages = []
-            prompt = analysis_prompt or self._build_default_prompt()
-
-            for i, image_path in enumerate(images, 1):
-                print(f"正在分析页面 {i}/{len(images)}...")
-
-                try:
-                    # 调用 VL 引擎
-                    result = await self.vl_manager.analyze_image(
-                        image_path=image_path,
-                        prompt=prompt,
-                        **kwargs
-                    )
-
-                    if result.get("success"):
-                        result_text = result.get("result", "")
-                        page_content = {
-                            "page_number": i,
-                            "text": result_text,
-                            "raw_text": result_text,
-                            "markdown": result_text,
-                            "metadata": {
-                                "vl_engine": result.get("engine", "unknown"),
-                                "vl_model": result.get("model", "unknown"),
-                            }
-                        }
-                        pages.append(page_content)
-                        print(f"  ✓ 页面 {i} 分析成功")
-                    else:
-                        error_msg = result.get("error", "未知错误")
-                        print(f"  ✗ 页面 {i} 分析失败: {error_msg}")
-                        page_content = {
-                            "page_number": i,
-                            "text": "",
-                            "raw_text": "",
-                            "markdown": f"<!-- 页面 {i} 分析失败: {error_msg} -->",
-                            "metadata": {
-                                "vl_engine": "failed",
-                                "vl_model": "unknown",
-                                "error": error_msg,
-                            }
-                        }
-                        pages.append(page_content)
-
-                except Exception as e:
-                    print(f"  ✗ 处理页面 {i} 时出错: {str(e)}")
-                    page_content = {
-                        "page_number": i,
-                        "text": "",
-                        "raw_text": "",
-                        "markdown": f"<!-- 页面 {i} 处理出错: {str(e)} -->",
-                        "metadata": {
-                            "vl_engine": "error",
-                            "vl_model": "unknown",
-                            "error": str(e),
-                        }
-                    }
-                    pages.append(page_content)
-
-                finally:
-                    # 清理临时图片
-                    try:
-                        os.unlink(image_path)
-                    except Exception:
-                        pass
-
-            # 4. 生成完整的 Markdown
-            markdown = self._generate_markdown(pages)
+            success_pages = native_text_pages = blank_pages = total_text_length = 0
+            # 未提供输出流时写入内存缓冲区
+            markdown_stream = output_stream if output_stream is not None else io.StringIO()
+            raw_buffer = io.StringIO() if output_stream is None else None
+
+            def on_page(page: Dict[str, Any]) -> None:
+                nonlocal success_pages, native_text_pages, blank_pages, total_text_length
+
+                text = page["text"]
+                vl_engine = page["metadata"]["vl_engine"]
+                is_first = page["page_number"] == 1
+
+                total_text_length += len(text)
+                success_pages += page["success"]
+                if vl_engine == "native":
+                    native_text_pages += 1
+                elif vl_engine == "blank":
+                    blank_pages += 1
+
+                markdown_stream.writelines(self._iter_page_markdown(page, not is_first))
+
+                if raw_buffer is None:
+                    pages.append({
+                        "page_number": page["page_number"],
+                        "success": page["success"],
+                        "metadata": page["metadata"],
+                    })
+                else:
+                    if not is_first:
+                        raw_buffer.write("\n\n---\n\n")
+                    raw_buffer.write(text)
+                    pages.append(page)
+
+            # 4. 分块转换图片并交给 worker 并发分析（转换与 VL 请求流水线重叠）
+            prompt = analysis_prompt or self._default_prompt
+            with tempfile.TemporaryDirectory(prefix="vlpdf_") as tmpdir:
+                await self._analyze_pages(
+                    pdf_path, total_pages, prompt, tmpdir, on_page, **kwargs
+                )
 
-            # 5. 提取原始文本
-            raw_text = "\n\n---\n\n".join([page.get("raw_text", "") for page in pages])
+            # 5. 统计信息（流式输出时 Markdown 已写出）
+            markdown = raw_text = None
+            if raw_buffer is not None:
+                markdown = markdown_stream.getvalue()
+                raw_text = raw_buffer.getvalue()
 
-            # 6. 统计信息
-            success_pages = sum(
-                1 for page in pages
-                if page.get("text") and not page.get("text").startswith("<!--")
-            )
             failed_pages = len(pages) - success_pages
-            total_text_length = sum(len(page.get("text", "")) for page in pages)
 
-            print(f"\n✓ 处理完成！")
-            print(f"  总页数: {len(pages)}")
-            print(f"  成功: {success_pages}")
-            print(f"  失败: {failed_pages}")
-            print(f"  成功率: {success_pages/len(pages)*100:.1f}%")
+            logger.info(
+                "✓ 处理完成！总页数: %d，成功: %d，失败: %d，成功率: %.1f%%",
+                len(pages), success_pages, failed_pages, success_pages / len(pages) * 100
+            )
 
             return {
                 "markdown": markdown,
@@ -177,7 +337,9 @@ class VLPDFConverter:
                 "metadata": {
                     "engine": "vl",
                     "page_count": len(pages),
-                    "image_count": len(images),
+                    "image_count": total_pages - native_text_pages - blank_pages,
+                    "native_text_pages": native_text_pages,
+                    "blank_pages": blank_pages,
                     "success_pages": success_pages,
                     "failed_pages": failed_pages,
                     "total_text_length": total_text_length,
@@ -185,74 +347,266 @@ class VLPDFConverter:
             }
 
         except Exception as e:
-            print(f"\n✗ PDF 转换失败: {str(e)}")
+            logger.error("✗ PDF 转换失败: %s", e)
             raise
 
-    def _pdf_to_images(self, pdf_path: Path) -> List[str]:
+    async def _analyze_pages(
+        self,
+        pdf_path: Path,
+        total_pages: int,
+        prompt: str,
+        out_dir: str,
+        on_page: Callable[[Dict[str, Any]], None],
+        chunk_size: int = 10,
+        **kwargs
+    ) -> None:
         """
-        将 PDF 转换为图片
+        边转换边分析所有页面
+
+        生成器按块产出页面图片放入有界队列，max_concurrent_pages 个 worker
+        从队列取图分析。队列满时转换会暂停，磁盘上待分析的图片数因此有上限。
+        页面完成顺序不定，先到的页面暂存，按页序依次交给 on_page。
 
         Args:
             pdf_path: PDF 文件路径
+            total_pages: 总页数
+            prompt: 分析提示词
+            out_dir: 页面图片目录（由调用方的临时目录统一清理）
+            on_page: 按页码顺序接收页面内容的回调
+            chunk_size: 每次转换的页数
+            **kwargs: 其他参数
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=chunk_size)
+        pending: Dict[int, Dict[str, Any]] = {}
+        next_page = 1
+
+        def complete(page: Dict[str, Any]) -> None:
+            nonlocal next_page
+            pending[page["page_number"]] = page
+            while next_page in pending:
+                on_page(pending.pop(next_page))
+                next_page += 1
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                page_number, image_path, native_text = item
+                if native_text == "":
+                    complete(self._blank_page(page_number))
+                elif native_text is not None:
+                    complete(self._native_text_page(page_number, native_text))
+                else:
+                    page = await self._analyze_page(
+                        page_number, image_path, total_pages, prompt, **kwargs
+                    )
+                    # 分析完立即删除，磁盘上只保留待分析的图片
+                    os.unlink(image_path)
+                    complete(page)
+
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(self.max_concurrent_pages)
+        ]
+        images = self._iter_pdf_images(pdf_path, total_pages, out_dir, chunk_size)
+
+        try:
+            async for item in images:
+                await queue.put(item)
+        except BaseException:
+            # 转换失败：停止 worker，剩余图片随临时目录一起删除
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        finally:
+            await images.aclose()
+
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    def _native_text_page(self, page_number: int, text: str) -> Dict[str, Any]:
+        """
+        使用 PDF 文本层构建页面内容
+
+        Args:
+            page_number: 页码（从 1 开始）
+            text: 文本层内容
 
         Returns:
-            图片文件路径列表
+            页面内容字典
         """
-        image_paths = []
+        logger.debug("✓ 页面 %d 使用 PDF 文本层，跳过 VL 分析", page_number)
+        return {
+            "page_number": page_number,
+            "text": text,
+            "success": True,
+            "metadata": {
+                "vl_engine": "native",
+                "vl_model": "pymupdf",
+            }
+        }
 
-        try:
-            # 优先使用 pdf2image
-            if PDF2IMAGE_AVAILABLE:
-                images = convert_from_path(
-                    str(pdf_path),
-                    dpi=200,
-                    fmt="jpeg",
-                    thread_count=4
-                )
+    def _blank_page(self, page_number: int) -> Dict[str, Any]:
+        """
+        构建空白页内容
 
-                # 保存图片到临时文件
-                for i, image in enumerate(images):
-                    with tempfile.NamedTemporaryFile(
-                        suffix=f"_page_{i + 1}.jpg",
-                        delete=False
-                    ) as tmp:
-                        image.save(tmp.name, "JPEG")
-                        image_paths.append(tmp.name)
+        Args:
+            page_number: 页码（从 1 开始）
 
-            # 回退到 PyMuPDF
-            elif PYMUPDF_AVAILABLE:
-                pdf_document = fitz.open(str(pdf_path))
+        Returns:
+            页面内容字典
+        """
+        logger.debug("✓ 页面 %d 为空白页，跳过 VL 分析", page_number)
+        return {
+            "page_number": page_number,
+            "text": "",
+            "markdown": f"<!-- 页面 {page_number} 空白 -->",
+            # 空白页没有文本，但不算失败
+            "success": True,
+            "metadata": {
+                "vl_engine": "blank",
+                "vl_model": "none",
+            }
+        }
 
-                for page_num in range(len(pdf_document)):
-                    page = pdf_document.load_page(page_num)
+    async def _analyze_page(
+        self,
+        page_number: int,
+        image_path: str,
+        total_pages: int,
+        prompt: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        分析单页图片
 
-                    # 设置缩放因子
-                    mat = fitz.Matrix(2.0, 2.0)
-                    pix = page.get_pixmap(matrix=mat)
+        Args:
+            page_number: 页码（从 1 开始）
+            image_path: 页面图片路径
+            total_pages: 总页数
+            prompt: 分析提示词
+            **kwargs: 其他参数
 
-                    with tempfile.NamedTemporaryFile(
-                        suffix=f"_page_{page_num + 1}.jpg",
-                        delete=False
-                    ) as tmp:
-                        pix.save(tmp.name)
-                        image_paths.append(tmp.name)
+        Returns:
+            页面内容字典
+        """
+        logger.debug("正在分析页面 %d/%d...", page_number, total_pages)
 
-                pdf_document.close()
+        try:
+            # 调用 VL 引擎
+            result = await self.vl_manager.analyze_image(
+                image_path=image_path,
+                prompt=prompt,
+                **kwargs
+            )
 
-            else:
-                raise RuntimeError("没有可用的 PDF 转图片工具")
+            if result.get("success"):
+                result_text = result.get("result", "")
+                logger.debug("✓ 页面 %d 分析成功", page_number)
+                # 成功页只保存一份文本，Markdown 和原始文本均由 text 生成
+                return {
+                    "page_number": page_number,
+                    "text": result_text,
+                    "success": bool(result_text),
+                    "metadata": {
+                        "vl_engine": result.get("engine", "unknown"),
+                        "vl_model": result.get("model", "unknown"),
+                    }
+                }
 
-            return image_paths
+            error_msg = result.get("error", "未知错误")
+            logger.warning("✗ 页面 %d 分析失败: %s", page_number, error_msg)
+            return {
+                "page_number": page_number,
+                "text": "",
+                "markdown": f"<!-- 页面 {page_number} 分析失败: {error_msg} -->",
+                "success": False,
+                "metadata": {
+                    "vl_engine": "failed",
+                    "vl_model": "unknown",
+                    "error": error_msg,
+                }
+            }
 
         except Exception as e:
-            # 清理已创建的图片文件
-            for path in image_paths:
-                try:
-                    os.unlink(path)
-                except Exception:
-                    pass
+            logger.warning("✗ 处理页面 %d 时出错: %s", page_number, e)
+            return {
+                "page_number": page_number,
+                "text": "",
+                "markdown": f"<!-- 页面 {page_number} 处理出错: {str(e)} -->",
+                "success": False,
+                "metadata": {
+                    "vl_engine": "error",
+                    "vl_model": "unknown",
+                    "error": str(e),
+                }
+            }
+
+    def _get_page_count(self, pdf_path: Path) -> int:
+        """
+        获取 PDF 页数
+
+        Args:
+            pdf_path: PDF 文件路径
+
+        Returns:
+            页数
+        """
+        if PYMUPDF_AVAILABLE:
+            with fitz.open(str(pdf_path)) as pdf_document:
+                return pdf_document.page_count
 
-            raise RuntimeError(f"PDF 转图片失败: {str(e)}") from e
+        if PDF2IMAGE_AVAILABLE:
+            return int(pdfinfo_from_path(str(pdf_path))["Pages"])
+
+        raise RuntimeError("没有可用的 PDF 转图片工具")
+
+    async def _iter_pdf_images(
+        self,
+        pdf_path: Path,
+        total_pages: int,
+        out_dir: str,
+        chunk_size: int = 10
+    ) -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        分块将 PDF 转换为图片，逐页产出
+
+        每块提交到进程池转换，不阻塞事件循环，多个 PDF 的转换可以并行使用多核。
+
+        Args:
+            pdf_path: PDF 文件路径
+            total_pages: 总页数
+            out_dir: 图片输出目录
+            chunk_size: 每次转换的页数
+
+        Yields:
+            (页码, 图片文件路径, 原生文本)，有原生文本的页面和空白页（原生文本为 ""）不生成图片
+        """
+        loop = asyncio.get_running_loop()
+        pool = _get_raster_pool()
+
+        for first_page in range(1, total_pages + 1, chunk_size):
+            last_page = min(first_page + chunk_size - 1, total_pages)
+
+            async with self._raster_semaphore:
+                rendered = await loop.run_in_executor(
+                    pool,
+                    _render_pdf_chunk,
+                    str(pdf_path),
+                    first_page,
+                    last_page,
+                    out_dir,
+                    self.target_dpi,
+                    self.jpeg_quality,
+                    self.native_text_min_chars,
+                    self.skip_blank_pages
+                )
+
+            for page_number, (path, native_text) in enumerate(rendered, first_page):
+                yield page_number, path, native_text
 
     def _build_default_prompt(self) -> str:
         """
@@ -282,29 +636,38 @@ class VLPDFConverter:
 
 请严格按照要求提取页面内容。"""
 
-    def _generate_markdown(self, pages: List[Dict[str, Any]]) -> str:
+    def iter_markdown(self, pages: List[Dict[str, Any]]) -> Iterator[str]:
         """
-        生成完整的 Markdown
+        逐段产出 Markdown，写文件时无需先拼接出完整字符串
 
         Args:
             pages: 页面内容列表
 
-        Returns:
-            完整的 Markdown 文本
+        Yields:
+            Markdown 片段
         """
-        markdown_parts = []
-
         for i, page in enumerate(pages):
-            # 添加页码标题
-            markdown_parts.append(f"\n\n## 第 {page['page_number']} 页\n")
+            yield from self._iter_page_markdown(page, i > 0)
 
-            # 添加页面内容
-            page_content = page.get("markdown", "")
-            if page_content:
-                markdown_parts.append(page_content)
+    def _iter_page_markdown(self, page: Dict[str, Any], separator: bool) -> Iterator[str]:
+        """
+        逐段产出单页 Markdown
+
+        Args:
+            page: 页面内容
+            separator: 是否在页前添加分隔符（第一页除外）
+
+        Yields:
+            Markdown 片段
+        """
+        # 添加页面分隔符
+        if separator:
+            yield "\n\n---\n"
 
-            # 添加页面分隔符（最后一页除外）
-            if i < len(pages) - 1:
-                markdown_parts.append("\n\n---\n")
+        # 添加页码标题
+        yield f"\n\n## 第 {page['page_number']} 页\n"
 
-        return "".join(markdown_parts)
+        # 添加页面内容（失败页使用 markdown 中的注释说明）
+        page_content = page.get("markdown", page["text"])
+        if page_content:
+            yield page_content
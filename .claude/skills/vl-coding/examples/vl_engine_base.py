@@ -6,8 +6,14 @@ VL 引擎基类
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 from datetime import datetime, timezone
+import asyncio
+import base64
+import os
 import time
 
+# 分块读取图片的块大小（3 的倍数，保证各块 base64 编码可直接拼接）
+IMAGE_READ_CHUNK_SIZE = 3 * 256 * 1024
+
 
 class VLEngineMetrics:
     """VL 引擎性能指标"""
@@ -18,6 +24,25 @@ class VLEngineMetrics:
         self.total_duration_ms = 0.0
         self.last_request_time = None
         self.last_error = None
+        # to_dict() 结果缓存，record() 时失效
+        self._dict_cache: Optional[Dict[str, Any]] = None
+
+    def record(self, duration_ms: float, success: bool, error: Optional[str] = None):
+        """
+        记录一次请求
+
+        Args:
+            duration_ms: 请求耗时（毫秒）
+            success: 是否成功
+            error: 错误信息
+        """
+        self.total_requests += 1
+        if not success:
+            self.failed_requests += 1
+            self.last_error = error
+        self.total_duration_ms += duration_ms
+        self.last_request_time = datetime.now(timezone.utc)
+        self._dict_cache = None
 
     @property
     def success_rate(self) -> float:
@@ -34,20 +59,25 @@ class VLEngineMetrics:
         return self.total_duration_ms / self.total_requests
 
     def to_dict(self) -> Dict[str, Any]:
-        """转换为字典"""
-        return {
-            "total_requests": self.total_requests,
-            "failed_requests": self.failed_requests,
-            "success_rate": f"{self.success_rate:.1%}",
-            "avg_latency_ms": f"{self.avg_latency_ms:.1f}",
-            "last_request_time": self.last_request_time.isoformat() if self.last_request_time else None,
-            "last_error": self.last_error
-        }
+        """转换为字典（指标未变化时返回缓存结果，调用方不应修改）"""
+        if self._dict_cache is None:
+            self._dict_cache = {
+                "total_requests": self.total_requests,
+                "failed_requests": self.failed_requests,
+                "success_rate": f"{self.success_rate:.1%}",
+                "avg_latency_ms": f"{self.avg_latency_ms:.1f}",
+                "last_request_time": self.last_request_time.isoformat() if self.last_request_time else None,
+                "last_error": self.last_error
+            }
+        return self._dict_cache
 
 
 class VLEngineBase(ABC):
     """VL 引擎基类"""
 
+    # 子类如需同样省去实例 __dict__，应声明自己的 __slots__
+    __slots__ = ("engine_name", "model_name", "metrics", "_enabled")
+
     def __init__(self, engine_name: str, model_name: str):
         """
         初始化引擎
@@ -111,6 +141,69 @@ class VLEngineBase(ABC):
         """
         pass
 
+    async def close(self) -> None:
+        """
+        释放引擎持有的资源（连接池、线程池等）
+
+        默认只停用引擎，持有资源的子类应覆盖。
+        """
+        self._enabled = False
+
+    async def _read_image_base64(self, image_path: str) -> str:
+        """
+        读取图片并编码为 base64
+
+        在线程中分块读取并逐块编码，不阻塞事件循环，
+        也无需同时持有完整原始字节和完整编码结果两份副本。
+
+        Args:
+            image_path: 图片路径
+
+        Returns:
+            base64 编码字符串
+        """
+        return await asyncio.to_thread(self._encode_file_base64, image_path)
+
+    async def _read_image_data_url(self, image_path: str, mime_type: str = "image/jpeg") -> str:
+        """
+        读取图片并编码为 data URL
+
+        前缀直接写入编码缓冲区，省去拼接 f-string 时对整个 base64 串的再次复制。
+
+        Args:
+            image_path: 图片路径
+            mime_type: 图片 MIME 类型
+
+        Returns:
+            data:<mime>;base64,... 字符串
+        """
+        return await asyncio.to_thread(
+            self._encode_file_base64, image_path, f"data:{mime_type};base64,"
+        )
+
+    @staticmethod
+    def _encode_file_base64(image_path: str, prefix: str = "") -> str:
+        """分块读取文件并编码为 base64（同步实现）"""
+        header = prefix.encode("ascii")
+
+        with open(image_path, "rb") as f:
+            # 按文件大小一次性分配输出缓冲区，读取缓冲区也在各块间复用
+            size = os.fstat(f.fileno()).st_size
+            encoded = bytearray(len(header) + 4 * ((size + 2) // 3))
+            encoded[:len(header)] = header
+            pos = len(header)
+
+            chunk = memoryview(bytearray(IMAGE_READ_CHUNK_SIZE))
+            while n := f.readinto(chunk):
+                block = base64.b64encode(chunk[:n])
+                encoded[pos:pos + len(block)] = block
+                pos += len(block)
+
+        # 文件在读取期间被截断时按实际长度截取
+        if pos != len(encoded):
+            del encoded[pos:]
+        return encoded.decode("ascii")
+
     def record_request(self, duration_ms: float, success: bool, error: Optional[str] = None):
         """
         记录请求指标
@@ -120,12 +213,7 @@ class VLEngineBase(ABC):
             success: 是否成功
             error: 错误信息
         """
-        self.metrics.total_requests += 1
-        if not success:
-            self.metrics.failed_requests += 1
-            self.metrics.last_error = error
-        self.metrics.total_duration_ms += duration_ms
-        self.metrics.last_request_time = datetime.now(timezone.utc)
+        self.metrics.record(duration_ms, success, error)
 
     def get_status(self) -> Dict[str, Any]:
         """
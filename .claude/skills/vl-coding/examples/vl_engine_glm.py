@@ -4,7 +4,10 @@ GLM-4V 视觉语言引擎实现
 """
 
 import os
-import base64
+import random
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from typing import Dict, Any, Optional
 import asyncio
 
@@ -18,6 +21,39 @@ except ImportError:
     ZHIPUAI_AVAILABLE = False
     ZhipuAI = None
 
+# SDK 异常类型，用于区分可重试错误
+try:
+    from zhipuai import APIConnectionError, APIStatusError, APITimeoutError
+    RETRYABLE_SDK_ERRORS = (APIConnectionError, APITimeoutError)
+except ImportError:
+    APIStatusError = None
+    RETRYABLE_SDK_ERRORS = ()
+
+# 可重试的 HTTP 状态码（限流与服务端错误）
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# zhipuai 基于 httpx，这里显式构造连接池以复用连接
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    httpx = None
+
+# 安装 h2 后启用 HTTP/2，多个并发请求复用同一连接
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+@lru_cache(maxsize=32)
+def _text_content_block(prompt: str) -> Dict[str, Any]:
+    """
+    构建提示词消息块（按提示词缓存）
+
+    批量处理时所有页面使用同一提示词，复用同一个消息块，
+    只有图片部分需要每次新建。SDK 只读取该字典，不会修改。
+    """
+    return {"type": "text", "text": prompt}
+
 
 class GLMVLEngine(VLEngineBase):
     """GLM-4V 视觉语言引擎"""
@@ -27,7 +63,9 @@ class GLMVLEngine(VLEngineBase):
         api_key: Optional[str] = None,
         api_base: str = "https://open.bigmodel.cn/api/paas/v4/",
         model_name: str = "glm-4v-plus-0111",
-        timeout: int = 60
+        timeout: int = 60,
+        max_connections: int = 64,
+        max_retries: int = 2
     ):
         """
         初始化 GLM 引擎
@@ -37,12 +75,20 @@ class GLMVLEngine(VLEngineBase):
             api_base: API 基础 URL
             model_name: 模型名称
             timeout: 请求超时时间（秒）
+            max_connections: HTTP 连接池大小（应不小于并发请求数）
+            max_retries: 超时、限流和服务端错误的最大重试次数
         """
         super().__init__("glm", model_name)
         self.api_key = api_key or os.getenv("GLM_API_KEY", "")
         self.api_base = api_base
         self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_retries = max_retries
         self.client = None
+        # zhipuai SDK 没有 asyncio 客户端，同步调用放到专用线程池，
+        # 线程数与连接池一致，不受默认线程池大小限制
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._http_client = None
 
     async def initialize(self) -> bool:
         """
@@ -51,6 +97,10 @@ class GLMVLEngine(VLEngineBase):
         Returns:
             是否初始化成功
         """
+        # 已初始化则直接复用客户端和连接池
+        if self._enabled and self.client is not None:
+            return True
+
         try:
             if not self.api_key:
                 print("⚠️  GLM API 密钥未配置")
@@ -62,8 +112,24 @@ class GLMVLEngine(VLEngineBase):
                 self._enabled = False
                 return False
 
-            # 初始化客户端
-            self.client = ZhipuAI(api_key=self.api_key)
+            # 初始化客户端（使用长连接池，避免每次请求重新握手）
+            http_client = None
+            if HTTPX_AVAILABLE:
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections
+                    ),
+                    http2=HTTP2_AVAILABLE,
+                    timeout=self.timeout
+                )
+            self._http_client = http_client
+            self.client = ZhipuAI(api_key=self.api_key, http_client=http_client)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_connections,
+                    thread_name_prefix="glm-vl"
+                )
             self._enabled = True
             print(f"✓ GLM 引擎初始化成功 (模型: {self.model_name})")
             return True
@@ -112,44 +178,49 @@ class GLMVLEngine(VLEngineBase):
                     "model": self.model_name
                 }
 
-            # 编码图片
-            with open(image_path, "rb") as f:
-                image_data = base64.b64encode(f.read()).decode("utf-8")
+            # 编码图片（直接生成 data URL）
+            image_url = await self._read_image_data_url(image_path)
 
             # 构建消息
             messages = [
                 {
                     "role": "user",
                     "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
+                        _text_content_block(prompt),
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_data}"
+                                "url": image_url
                             }
                         }
                     ]
                 }
             ]
 
-            # 调用 API
-            response = await asyncio.wait_for(
-                asyncio.to_thread(
-                    self.client.chat.completions.create,
-                    model=self.model_name,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                ),
-                timeout=self.timeout
-            )
+            # 调用 API（可重试错误按带抖动的指数退避重试）
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await asyncio.wait_for(
+                        self._create_completion(
+                            model=self.model_name,
+                            messages=messages,
+                            temperature=temperature,
+                            max_tokens=max_tokens
+                        ),
+                        timeout=self.timeout
+                    )
+                    break
+                except Exception as e:
+                    if attempt >= self.max_retries or not self._is_retryable(e):
+                        raise
+                    # 随机抖动避免批量请求同步重试
+                    await asyncio.sleep(min(2 ** attempt, 8) * (0.5 + random.random()))
 
-            # 解析响应
-            if response.choices and response.choices[0].message:
-                result_text = response.choices[0].message.content
+            # 解析响应（每个属性只访问一次）
+            choices = response.choices
+            message = getattr(choices[0], "message", None) if choices else None
+            if message is not None:
+                result_text = message.content
                 return {
                     "success": True,
                     "result": result_text,
@@ -190,9 +261,8 @@ class GLMVLEngine(VLEngineBase):
             return False
 
         try:
-            response = await asyncio.wait_for(
-                asyncio.to_thread(
-                    self.client.chat.completions.create,
+            await asyncio.wait_for(
+                self._create_completion(
                     model=self.model_name,
                     messages=[{"role": "user", "content": "ping"}],
                     max_tokens=10
@@ -202,3 +272,51 @@ class GLMVLEngine(VLEngineBase):
             return True
         except Exception:
             return False
+
+    async def close(self) -> None:
+        """
+        关闭线程池和连接池
+
+        超时后被放弃的同步调用仍占用线程，关闭时不等待它们结束，并取消尚未开始的调用。
+        """
+        self._enabled = False
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+        self.client = None
+
+    async def _create_completion(self, **params) -> Any:
+        """
+        在专用线程池中调用同步 SDK
+
+        Args:
+            **params: chat.completions.create 参数
+
+        Returns:
+            SDK 响应对象
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            partial(self.client.chat.completions.create, **params)
+        )
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """
+        判断错误是否值得重试
+
+        Args:
+            error: 调用异常
+
+        Returns:
+            超时、连接错误、限流和 5xx 返回 True
+        """
+        if isinstance(error, (asyncio.TimeoutError, *RETRYABLE_SDK_ERRORS)):
+            return True
+        if APIStatusError is not None and isinstance(error, APIStatusError):
+            return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+        return False
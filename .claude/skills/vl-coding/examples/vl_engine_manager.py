@@ -3,12 +3,18 @@ VL 引擎管理器
 管理多个VL引擎的生命周期、故障转移和性能监控
 """
 
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
 import asyncio
+import hashlib
+import logging
+import os
 import time
 
 from vl_engine_base import VLEngineBase
 
+logger = logging.getLogger(__name__)
+
 
 class VLEngineManager:
     """VL 引擎管理器"""
@@ -20,6 +26,12 @@ class VLEngineManager:
         self.fallback_engine: Optional[str] = None
         self.auto_switch: bool = True
         self.request_timeout_seconds: int = 30
+        self.init_timeout_seconds: int = 15
+        # 按图片内容缓存成功的分析结果（LRU），设为 0 关闭
+        self.response_cache_size: int = 4096
+        self._response_cache: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        # 进行中的请求，按缓存键合并并发的相同请求
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
 
     def register_engine(self, engine: VLEngineBase) -> None:
         """
@@ -29,7 +41,7 @@ class VLEngineManager:
             engine: VL 引擎实例
         """
         self.engines[engine.engine_name] = engine
-        print(f"✓ 已注册引擎: {engine.engine_name} ({engine.model_name})")
+        logger.info("✓ 已注册引擎: %s (%s)", engine.engine_name, engine.model_name)
 
     async def initialize_engines(self) -> bool:
         """
@@ -38,19 +50,35 @@ class VLEngineManager:
         Returns:
             是否至少有一个引擎初始化成功
         """
-        print("开始初始化 VL 引擎...")
-        results = []
+        # 所有引擎均已启用时无需重复初始化
+        if self.engines and all(engine.enabled for engine in self.engines.values()):
+            return True
+
+        logger.info("开始初始化 VL 引擎...")
+
+        # 并发初始化，总耗时取决于最慢的引擎而非所有引擎之和
+        names = list(self.engines)
+        outcomes = await asyncio.gather(
+            *(
+                asyncio.wait_for(engine.initialize(), timeout=self.init_timeout_seconds)
+                for engine in self.engines.values()
+            ),
+            return_exceptions=True
+        )
 
-        for engine_name, engine in self.engines.items():
-            try:
-                success = await engine.initialize()
-                results.append(success)
-                if success:
-                    print(f"✓ {engine_name} 引擎初始化成功")
-                else:
-                    print(f"✗ {engine_name} 引擎初始化失败")
-            except Exception as e:
-                print(f"✗ {engine_name} 引擎初始化出错: {str(e)}")
+        results = []
+        for engine_name, outcome in zip(names, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                logger.error("✗ %s 引擎初始化超时", engine_name)
+                results.append(False)
+            elif isinstance(outcome, Exception):
+                logger.error("✗ %s 引擎初始化出错: %s", engine_name, outcome)
+                results.append(False)
+            elif outcome:
+                logger.info("✓ %s 引擎初始化成功", engine_name)
+                results.append(True)
+            else:
+                logger.error("✗ %s 引擎初始化失败", engine_name)
                 results.append(False)
 
         return any(results)
@@ -65,7 +93,7 @@ class VLEngineManager:
         if engine_name not in self.engines:
             raise ValueError(f"引擎 {engine_name} 未注册")
         self.primary_engine = engine_name
-        print(f"主引擎设置为: {engine_name}")
+        logger.info("主引擎设置为: %s", engine_name)
 
     def set_fallback_engine(self, engine_name: str) -> None:
         """
@@ -77,7 +105,7 @@ class VLEngineManager:
         if engine_name not in self.engines:
             raise ValueError(f"引擎 {engine_name} 未注册")
         self.fallback_engine = engine_name
-        print(f"备用引擎设置为: {engine_name}")
+        logger.info("备用引擎设置为: %s", engine_name)
 
     def get_current_engine(self) -> Optional[str]:
         """获取当前主引擎名称"""
@@ -118,7 +146,7 @@ class VLEngineManager:
             }
 
         # 尝试主引擎
-        print(f"尝试使用主引擎: {primary}")
+        logger.debug("尝试使用主引擎: %s", primary)
         result = await self._try_engine(primary, image_path, prompt, **kwargs)
 
         if result.get("success"):
@@ -126,7 +154,7 @@ class VLEngineManager:
 
         # 如果主引擎失败，尝试回退引擎
         if self.auto_switch and fallback and fallback != primary:
-            print(f"主引擎失败，尝试备用引擎: {fallback}")
+            logger.warning("主引擎失败，尝试备用引擎: %s", fallback)
             result = await self._try_engine(fallback, image_path, prompt, **kwargs)
             if result.get("success"):
                 return result
@@ -159,15 +187,89 @@ class VLEngineManager:
         if not engine.enabled:
             return {"success": False, "error": f"引擎 {engine_name} 未启用"}
 
+        # 相同图片 + 相同提示词 + 相同参数直接返回缓存结果（封面、空白页、模板页等）
+        cache_key = None
+        # 只对本地文件做缓存（URL / 字节输入时 image_path 为 None）
+        if self.response_cache_size > 0 and isinstance(image_path, (str, os.PathLike)):
+            try:
+                digest = await asyncio.to_thread(self._hash_image, image_path)
+            except OSError:
+                digest = None
+            if digest is not None:
+                cache_key = (
+                    engine_name, engine.model_name, digest, prompt,
+                    repr(sorted(kwargs.items()))
+                )
+                cached = self._response_cache.get(cache_key)
+                if cached is not None:
+                    self._response_cache.move_to_end(cache_key)
+                    return dict(cached)
+
+        if cache_key is None:
+            return await self._call_engine(engine, image_path, prompt, None, **kwargs)
+
+        # 相同请求正在进行时等待其结果，不重复调用（并发分析的重复页面）
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            try:
+                return dict(await asyncio.shield(inflight))
+            except asyncio.CancelledError:
+                # 先行请求被取消时自行发起请求，自身被取消则继续抛出
+                if not inflight.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        try:
+            result = await self._call_engine(engine, image_path, prompt, cache_key, **kwargs)
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            if self._inflight.get(cache_key) is future:
+                del self._inflight[cache_key]
+
+        future.set_result(result)
+        return result
+
+    async def _call_engine(
+        self,
+        engine: VLEngineBase,
+        image_path: str,
+        prompt: str,
+        cache_key: Optional[Tuple],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        调用引擎并记录指标，成功结果写入缓存
+
+        Args:
+            engine: VL 引擎
+            image_path: 图片路径
+            prompt: 分析提示词
+            cache_key: 结果缓存键（None 表示不缓存）
+            **kwargs: 其他参数
+
+        Returns:
+            分析结果
+        """
+        engine_name = engine.engine_name
+
         try:
-            start_time = time.time()
+            start_ns = time.perf_counter_ns()
             result = await asyncio.wait_for(
                 engine.analyze_image(image_path, prompt, **kwargs),
                 timeout=self.request_timeout_seconds
             )
-            duration_ms = (time.time() - start_time) * 1000
+            duration_ms = (time.perf_counter_ns() - start_ns) / 1e6
 
             engine.record_request(duration_ms, result.get("success", False))
+
+            if cache_key is not None and result.get("success"):
+                self._response_cache[cache_key] = dict(result)
+                if len(self._response_cache) > self.response_cache_size:
+                    self._response_cache.popitem(last=False)
+
             return result
 
         except asyncio.TimeoutError:
@@ -177,6 +279,22 @@ class VLEngineManager:
             engine.record_request(0, False, str(e))
             return {"success": False, "error": f"引擎 {engine_name} 错误: {str(e)}"}
 
+    @staticmethod
+    def _hash_image(image_path: str) -> bytes:
+        """计算图片内容摘要（BLAKE2b 比 SHA-256 更快）"""
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(image_path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                hasher.update(chunk)
+        return hasher.digest()
+
+    async def close(self) -> None:
+        """关闭所有引擎，释放连接池和线程池"""
+        await asyncio.gather(
+            *(engine.close() for engine in self.engines.values()),
+            return_exceptions=True
+        )
+
     def get_status(self) -> Dict[str, Any]:
         """
         获取所有引擎状态
@@ -196,11 +314,21 @@ class VLEngineManager:
         Returns:
             引擎健康状态字典
         """
+        # 并发检查所有引擎
+        names = list(self.engines)
+        outcomes = await asyncio.gather(
+            *(
+                asyncio.wait_for(engine.health_check(), timeout=self.init_timeout_seconds)
+                for engine in self.engines.values()
+            ),
+            return_exceptions=True
+        )
+
         results = {}
-        for engine_name, engine in self.engines.items():
-            try:
-                results[engine_name] = await engine.health_check()
-            except Exception as e:
-                print(f"健康检查失败 {engine_name}: {str(e)}")
+        for engine_name, outcome in zip(names, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning("健康检查失败 %s: %s", engine_name, str(outcome) or type(outcome).__name__)
                 results[engine_name] = False
+            else:
+                results[engine_name] = outcome
         return results
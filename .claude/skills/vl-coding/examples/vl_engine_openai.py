@@ -4,12 +4,17 @@ OpenAI GPT-4V 视觉语言引擎实现
 """
 
 import os
-import base64
-from typing import Dict, Any, Optional
+import logging
+from functools import lru_cache
+from typing import Dict, Any, Optional, Set
 import asyncio
+import base64
+import time
 
 from vl_engine_base import VLEngineBase
 
+logger = logging.getLogger(__name__)
+
 # 尝试导入 openai SDK
 try:
     import openai
@@ -18,16 +23,52 @@ except ImportError:
     OPENAI_AVAILABLE = False
     openai = None
 
+# SDK 自身的超时异常（传入 timeout 后由 SDK 抛出，而非 asyncio.TimeoutError）
+OPENAI_TIMEOUT_ERRORS = (asyncio.TimeoutError,)
+if OPENAI_AVAILABLE:
+    OPENAI_TIMEOUT_ERRORS += (openai.APITimeoutError,)
+
+# openai SDK 基于 httpx，这里显式构造共享连接池
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    httpx = None
+
+# 超过该大小的图片不进入编码缓存，限制缓存占用的内存
+IMAGE_CACHE_MAX_BYTES = 2 * 1024 * 1024
+
+
+@lru_cache(maxsize=256)
+def _encode_image(path: str, mtime_ns: int, size: int) -> str:
+    """
+    编码图片为 data URL（按路径、修改时间和大小缓存）
+
+    同一图片被重复分析时直接复用编码结果；文件被修改后
+    mtime/size 变化，自然不会命中旧条目。
+    """
+    return VLEngineBase._encode_file_base64(path, "data:image/jpeg;base64,")
+
 
 class OpenAIVLEngine(VLEngineBase):
     """OpenAI GPT-4V 视觉语言引擎"""
 
+    __slots__ = (
+        "api_key", "base_url", "timeout", "max_image_bytes", "max_connections",
+        "health_ttl", "max_concurrent", "client", "_api_sem", "_last_ok_ts"
+    )
+
     def __init__(
         self,
         api_key: Optional[str] = None,
         base_url: str = "https://api.openai.com/v1",
         model_name: str = "gpt-4o",
-        timeout: int = 60
+        timeout: int = 60,
+        max_image_bytes: Optional[int] = 20 * 1024 * 1024,
+        max_connections: int = 64,
+        health_ttl: float = 30.0,
+        max_concurrent: int = 16
     ):
         """
         初始化 OpenAI 引擎
@@ -37,12 +78,24 @@ class OpenAIVLEngine(VLEngineBase):
             base_url: API 基础 URL
             model_name: 模型名称
             timeout: 请求超时时间（秒）
+            max_image_bytes: 允许编码的最大图片字节数（None 表示不限制）
+            max_connections: HTTP 连接池大小（应不小于并发请求数）
+            health_ttl: 健康检查结果的缓存时间（秒）
+            max_concurrent: 同时进行的最大 API 请求数，超出的请求排队等待
         """
         super().__init__("openai", model_name)
         self.api_key = api_key or os.getenv("OPENAI_API_KEY", "")
         self.base_url = base_url
         self.timeout = timeout
+        self.max_image_bytes = max_image_bytes
+        self.max_connections = max_connections
+        self.health_ttl = health_ttl
+        self.max_concurrent = max_concurrent
         self.client = None
+        # 限制同时发出的 API 请求数，在 initialize() 中创建
+        self._api_sem: Optional[asyncio.Semaphore] = None
+        # 最近一次健康检查成功的时间（time.monotonic）
+        self._last_ok_ts: Optional[float] = None
 
     async def initialize(self) -> bool:
         """
@@ -51,71 +104,159 @@ class OpenAIVLEngine(VLEngineBase):
         Returns:
             是否初始化成功
         """
+        # 已初始化则直接复用客户端和连接池
+        if self._enabled and self.client is not None:
+            return True
+
         try:
             if not self.api_key:
-                print("⚠️  OpenAI API 密钥未配置")
+                logger.warning("⚠️  OpenAI API 密钥未配置")
                 self._enabled = False
                 return False
 
             if not OPENAI_AVAILABLE:
-                print("⚠️  openai SDK 未安装，请运行: pip install openai")
+                logger.warning("⚠️  openai SDK 未安装，请运行: pip install openai")
                 self._enabled = False
                 return False
 
-            # 初始化客户端
-            self.client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url)
+            # 初始化异步客户端（并发请求共享事件循环和长连接池，不占用线程池）
+            http_client = None
+            if HTTPX_AVAILABLE:
+                http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections
+                    ),
+                    timeout=self.timeout
+                )
+            self.client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                http_client=http_client
+            )
+            self._api_sem = asyncio.Semaphore(self.max_concurrent)
             self._enabled = True
-            print(f"✓ OpenAI 引擎初始化成功 (模型: {self.model_name})")
+            logger.info("✓ OpenAI 引擎初始化成功 (模型: %s)", self.model_name)
             return True
 
         except Exception as e:
-            print(f"✗ OpenAI 引擎初始化失败: {str(e)}")
+            logger.error("✗ OpenAI 引擎初始化失败: %s", e)
             self._enabled = False
             return False
 
     async def analyze_image(
         self,
-        image_path: str,
+        image_path: Optional[str],
         prompt: str,
         temperature: float = 0.3,
         max_tokens: int = 1500,
+        image_url: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
         分析图片
 
         Args:
-            image_path: 图片路径
+            image_path: 图片路径（提供 image_url 时可为 None）
             prompt: 分析提示词
             temperature: 创造性参数 (0-1)
             max_tokens: 最大输出令牌数
+            image_url: 图片的远程 URL（如对象存储地址），提供时直接发送，不读取本地文件
             **kwargs: 其他参数
 
         Returns:
             分析结果
         """
         if not self._enabled or not self.client:
-            return {
-                "success": False,
-                "error": "OpenAI 引擎未初始化",
-                "engine": "openai",
-                "model": self.model_name
-            }
+            return self._error_result("OpenAI 引擎未初始化")
+
+        # 图片已可通过 URL 访问时直接发送，省去读取和 base64 编码
+        if image_url:
+            return await self._complete(image_url, prompt, temperature, max_tokens)
 
         try:
-            # 验证文件存在
-            if not os.path.exists(image_path):
-                return {
-                    "success": False,
-                    "error": f"图片文件不存在: {image_path}",
-                    "engine": "openai",
-                    "model": self.model_name
-                }
+            # 验证文件存在及大小（超限的图片不编码，避免占用大量内存）
+            try:
+                stat = os.stat(image_path)
+            except FileNotFoundError:
+                return self._error_result(f"图片文件不存在: {image_path}")
+            image_size = stat.st_size
+            if self.max_image_bytes is not None and image_size > self.max_image_bytes:
+                return self._error_result(
+                    f"图片文件过大: {image_size} 字节 (上限 {self.max_image_bytes})"
+                )
 
-            # 编码图片
-            with open(image_path, "rb") as f:
-                image_data = base64.b64encode(f.read()).decode("utf-8")
+            # 编码图片（在线程中分块读取，直接生成 data URL；小图片走缓存）
+            if image_size <= IMAGE_CACHE_MAX_BYTES:
+                data_url = await asyncio.to_thread(
+                    _encode_image, image_path, stat.st_mtime_ns, image_size
+                )
+            else:
+                data_url = await self._read_image_data_url(image_path)
+        except Exception as e:
+            return self._error_result(f"OpenAI API 错误: {str(e)}")
 
+        return await self._complete(data_url, prompt, temperature, max_tokens)
+
+    async def analyze_image_bytes(
+        self,
+        data: bytes,
+        prompt: str,
+        mime_type: str = "image/jpeg",
+        temperature: float = 0.3,
+        max_tokens: int = 1500,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        分析内存中的图片数据
+
+        适用于图片已在内存中（如上传请求体）的场景，避免先写入文件再读回。
+
+        Args:
+            data: 图片原始字节
+            prompt: 分析提示词
+            mime_type: 图片 MIME 类型
+            temperature: 创造性参数 (0-1)
+            max_tokens: 最大输出令牌数
+            **kwargs: 其他参数
+
+        Returns:
+            分析结果
+        """
+        if not self._enabled or not self.client:
+            return self._error_result("OpenAI 引擎未初始化")
+
+        if self.max_image_bytes is not None and len(data) > self.max_image_bytes:
+            return self._error_result(
+                f"图片数据过大: {len(data)} 字节 (上限 {self.max_image_bytes})"
+            )
+
+        # 编码在线程中进行，大图片不阻塞事件循环
+        encoded = await asyncio.to_thread(base64.b64encode, data)
+        data_url = f"data:{mime_type};base64," + encoded.decode("ascii")
+        return await self._complete(data_url, prompt, temperature, max_tokens)
+
+    async def _complete(
+        self,
+        image_url: str,
+        prompt: str,
+        temperature: float,
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        """
+        发送图片和提示词并解析响应
+
+        Args:
+            image_url: 远程 URL 或 data URL
+            prompt: 分析提示词
+            temperature: 创造性参数 (0-1)
+            max_tokens: 最大输出令牌数
+
+        Returns:
+            分析结果
+        """
+        try:
             # 构建消息
             messages = [
                 {
@@ -128,7 +269,7 @@ class OpenAIVLEngine(VLEngineBase):
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_data}",
+                                "url": image_url,
                                 "detail": "high"
                             }
                         }
@@ -136,17 +277,15 @@ class OpenAIVLEngine(VLEngineBase):
                 }
             ]
 
-            # 调用 API
-            response = await asyncio.wait_for(
-                asyncio.to_thread(
-                    self.client.chat.completions.create,
+            # 调用 API（超出并发上限时排队，而不是让上游过载后集体超时）
+            async with self._api_sem:
+                response = await self.client.chat.completions.create(
                     model=self.model_name,
                     messages=messages,
                     temperature=temperature,
-                    max_tokens=max_tokens
-                ),
-                timeout=self.timeout
-            )
+                    max_tokens=max_tokens,
+                    timeout=self.timeout
+                )
 
             # 解析响应
             if response.choices and response.choices[0].message:
@@ -158,48 +297,202 @@ class OpenAIVLEngine(VLEngineBase):
                     "model": self.model_name
                 }
             else:
-                return {
-                    "success": False,
-                    "error": "OpenAI API 返回空响应",
-                    "engine": "openai",
-                    "model": self.model_name
-                }
+                return self._error_result("OpenAI API 返回空响应")
 
-        except asyncio.TimeoutError:
-            return {
-                "success": False,
-                "error": "OpenAI API 超时",
-                "engine": "openai",
-                "model": self.model_name
-            }
+        except OPENAI_TIMEOUT_ERRORS:
+            logger.warning("OpenAI API 超时 (模型: %s)", self.model_name)
+            return self._error_result("OpenAI API 超时")
         except Exception as e:
-            return {
-                "success": False,
-                "error": f"OpenAI API 错误: {str(e)}",
-                "engine": "openai",
-                "model": self.model_name
-            }
+            logger.warning("OpenAI API 错误 (模型: %s): %s", self.model_name, e)
+            return self._error_result(f"OpenAI API 错误: {str(e)}")
 
-    async def health_check(self) -> bool:
+    def _error_result(self, error: str) -> Dict[str, Any]:
+        """构建失败结果"""
+        return {
+            "success": False,
+            "error": error,
+            "engine": "openai",
+            "model": self.model_name
+        }
+
+    async def health_check(self, deep: bool = False) -> bool:
         """
         健康检查
 
+        默认查询模型信息（GET 请求，不消耗 token），成功结果缓存 health_ttl 秒；
+        deep=True 时发送一次真实的生成请求并忽略缓存。
+
+        Args:
+            deep: 是否执行完整的生成请求检查
+
         Returns:
             引擎是否健康可用
         """
         if not self._enabled or not self.client:
             return False
 
+        now = time.monotonic()
+        if not deep and self._last_ok_ts is not None and now - self._last_ok_ts < self.health_ttl:
+            return True
+
         try:
-            response = await asyncio.wait_for(
-                asyncio.to_thread(
-                    self.client.chat.completions.create,
+            if deep:
+                await self.client.chat.completions.create(
                     model=self.model_name,
                     messages=[{"role": "user", "content": "ping"}],
-                    max_tokens=10
-                ),
-                timeout=10
-            )
-            return True
+                    max_tokens=10,
+                    timeout=10
+                )
+            else:
+                await self.client.models.retrieve(self.model_name, timeout=5)
         except Exception:
+            self._last_ok_ts = None
             return False
+
+        self._last_ok_ts = time.monotonic()
+        return True
+
+    async def close(self) -> None:
+        """关闭客户端及其共享的连接池"""
+        self._enabled = False
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+
+# 合并器队列中的停止标记，close() 放入后由后台任务处理完之前的请求再退出
+_STOP = object()
+
+
+class OpenAIVLEngineBatcher:
+    """
+    OpenAI 引擎请求合并器
+
+    在 max_wait_ms 窗口内收集并发到达的 analyze_image 调用（最多 max_batch 个），
+    整批通过引擎的共享连接池同时发出，每个调用方各自等待自己的结果。
+    适合多页文档等短时间内集中提交大量图片的场景。
+    """
+
+    def __init__(
+        self,
+        engine: OpenAIVLEngine,
+        max_batch: int = 16,
+        max_wait_ms: float = 20.0
+    ):
+        """
+        初始化合并器
+
+        Args:
+            engine: 已初始化的 OpenAI 引擎
+            max_batch: 单批最大请求数
+            max_wait_ms: 收集一批请求的最长等待时间（毫秒）
+        """
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[asyncio.Task] = None
+        # 正在执行的批次，close() 时等待其完成
+        self._batches: Set[asyncio.Task] = set()
+
+    async def analyze_image(self, image_path: str, prompt: str, **kwargs) -> Dict[str, Any]:
+        """
+        提交一次图片分析并等待结果
+
+        Args:
+            image_path: 图片路径
+            prompt: 分析提示词
+            **kwargs: 透传给引擎 analyze_image 的参数
+
+        Returns:
+            分析结果（与 OpenAIVLEngine.analyze_image 相同）
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._consumer is None or self._consumer.done():
+            # 复用原队列，后台任务重启后继续处理其中已提交的请求
+            self._consumer = asyncio.create_task(self._consume())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_path, prompt, kwargs, future))
+        return await future
+
+    async def close(self):
+        """处理完已提交的请求后停止后台任务，并等待已发出的批次完成"""
+        if self._consumer is not None:
+            if not self._consumer.done():
+                await self._queue.put(_STOP)
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        # 停止标记之后才提交的请求不再处理
+        self._cancel_pending([])
+
+    async def _consume(self):
+        """后台任务：按窗口收集请求并分批发出，收到停止标记时发出当前批次后退出"""
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is _STOP:
+                    return
+                batch = [item]
+                stopping = False
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+                # 批次独立执行，不阻塞下一批的收集
+                task = asyncio.create_task(self._dispatch(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+                batch = []
+                if stopping:
+                    return
+        except asyncio.CancelledError:
+            # 被外部取消时，收集中的批次和队列中的请求都不会再发出，取消其 future 避免调用方永久等待
+            self._cancel_pending(batch)
+            raise
+
+    def _cancel_pending(self, batch):
+        """取消给定批次及队列中剩余请求的 future"""
+        pending = list(batch)
+        if self._queue is not None:
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not _STOP:
+                    pending.append(item)
+        for _, _, _, future in pending:
+            if not future.done():
+                future.cancel()
+
+    async def _dispatch(self, batch):
+        """同时发出一批请求"""
+        await asyncio.gather(*(self._single_call(item) for item in batch))
+
+    async def _single_call(self, item):
+        """执行单个请求并把结果交给对应的调用方"""
+        image_path, prompt, kwargs, future = item
+        try:
+            result = await self.engine.analyze_image(image_path, prompt, **kwargs)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
@@ -12,19 +12,25 @@
 - 无需连接数据库和Redis
 
 使用方法：
-1. pip install fastapi uvicorn requests
+1. pip install fastapi uvicorn httpx orjson
 2. 修改下面的配置
 3. uvicorn docker_sso_quickstart:app --host 0.0.0.0 --port 8000
 """
 
 import os
+import asyncio
+import hashlib
+import logging
+import queue
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
-from datetime import datetime
 
-import requests
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
-from pydantic import BaseModel, EmailStr
+import httpx
+import orjson
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse, Response
+from pydantic import BaseModel
 
 # ============================================================================
 # 配置部分 - 请根据您的实际情况修改
@@ -36,6 +42,53 @@ DIFY_API_URL = os.getenv("DIFY_API_URL", "http://localhost:5001")
 # Dify前端地址（Docker部署通常是 http://宿主机IP:3000）
 DIFY_WEB_URL = os.getenv("DIFY_WEB_URL", "http://localhost:3000")
 
+# 同时发往Dify的最大登录请求数，超出的请求排队等待，避免压垮Dify导致集体超时
+DIFY_MAX_CONCURRENT = int(os.getenv("DIFY_MAX_CONCURRENT", "32"))
+
+# ============================================================================
+# HTTP客户端与日志 - 异步连接池复用到Dify API的连接（keep-alive），日志经队列异步写出
+# ============================================================================
+
+# 应用启动时创建，关闭时释放（见 lifespan）
+_http: Optional[httpx.AsyncClient] = None
+_dify_sem = asyncio.Semaphore(DIFY_MAX_CONCURRENT)
+
+# 日志：处理请求时只把记录放入队列，由后台线程写出，不阻塞事件循环
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动日志队列，创建并关闭共享的HTTP客户端"""
+    global _http
+    log_queue: queue.Queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s %(message)s"))
+    queue_handler = QueueHandler(log_queue)
+    listener = QueueListener(log_queue, stream_handler)
+    logger.addHandler(queue_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener.start()
+
+    _http = httpx.AsyncClient(
+        timeout=10,
+        # 连接失败时自动重试
+        transport=httpx.AsyncHTTPTransport(
+            retries=2,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        )
+    )
+    try:
+        yield
+    finally:
+        await _http.aclose()
+        _http = None
+        listener.stop()
+        logger.removeHandler(queue_handler)
+        logger.propagate = True
+
+
 # ============================================================================
 # FastAPI应用
 # ============================================================================
@@ -43,7 +96,9 @@ DIFY_WEB_URL = os.getenv("DIFY_WEB_URL", "http://localhost:3000")
 app = FastAPI(
     title="Dify SSO - Docker快速版",
     description="适用于Docker部署的Dify单点登录方案",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # JSON响应使用orjson序列化
 )
 
 # ============================================================================
@@ -52,7 +107,7 @@ app = FastAPI(
 
 class LoginRequest(BaseModel):
     """登录请求模型"""
-    email: EmailStr
+    email: str
     password: str
 
 
@@ -60,9 +115,9 @@ class LoginRequest(BaseModel):
 # 核心SSO逻辑
 # ============================================================================
 
-def call_dify_login_api(email: str, password: str) -> Optional[dict]:
+async def call_dify_login_api(email: str, password: str) -> Optional[dict]:
     """
-    调用Dify登录API获取token
+    调用Dify登录API获取token（异步，等待期间不阻塞其他请求）
     
     Args:
         email: 用户邮箱
@@ -79,35 +134,32 @@ def call_dify_login_api(email: str, password: str) -> Optional[dict]:
     }
     
     try:
-        response = requests.post(
-            login_url,
-            json=payload,
-            timeout=10,
-            headers={"Content-Type": "application/json"}
-        )
+        response = await _http.post(login_url, json=payload)
         
-        data = response.json()
+        # 先看状态码，失败时不解析响应体
+        if response.status_code >= 400:
+            logger.warning("登录失败: %s - HTTP %s", email, response.status_code)
+            return None
+        
+        data = orjson.loads(response.content)
         
         if data.get("result") == "success":
             return data.get("data")
         else:
             error_msg = data.get("data", "登录失败")
-            print(f"[{datetime.now()}] 登录失败: {email} - {error_msg}")
+            logger.warning("登录失败: %s - %s", email, error_msg)
             return None
             
     except Exception as e:
-        print(f"[{datetime.now()}] API调用失败: {e}")
+        logger.exception("Dify登录API调用失败")
         return None
 
 
 # ============================================================================
-# API路由
+# 登录页面 - 内容固定，导入时生成一次，所有请求复用同一个响应
 # ============================================================================
 
-@app.get("/", response_class=HTMLResponse)
-async def index():
-    """首页 - 简单的登录表单"""
-    html = f"""
+INDEX_HTML = """
     <!DOCTYPE html>
     <html lang="zh-CN">
     <head>
@@ -115,8 +167,8 @@ async def index():
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>Dify SSO登录</title>
         <style>
-            * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-            body {{
+            * { margin: 0; padding: 0; box-sizing: border-box; }
+            body {
                 font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
                 background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
                 display: flex;
@@ -124,51 +176,51 @@ async def index():
                 align-items: center;
                 min-height: 100vh;
                 padding: 20px;
-            }}
-            .container {{
+            }
+            .container {
                 background: white;
                 border-radius: 12px;
                 box-shadow: 0 20px 60px rgba(0,0,0,0.3);
                 padding: 40px;
                 max-width: 400px;
                 width: 100%;
-            }}
-            h1 {{
+            }
+            h1 {
                 color: #333;
                 margin-bottom: 10px;
                 font-size: 28px;
                 text-align: center;
-            }}
-            .subtitle {{
+            }
+            .subtitle {
                 color: #666;
                 margin-bottom: 30px;
                 font-size: 14px;
                 text-align: center;
-            }}
-            .form-group {{
+            }
+            .form-group {
                 margin-bottom: 20px;
-            }}
-            label {{
+            }
+            label {
                 display: block;
                 margin-bottom: 8px;
                 color: #555;
                 font-weight: 500;
                 font-size: 14px;
-            }}
-            input {{
+            }
+            input {
                 width: 100%;
                 padding: 12px 15px;
                 border: 2px solid #e0e0e0;
                 border-radius: 8px;
                 font-size: 14px;
                 transition: all 0.3s;
-            }}
-            input:focus {{
+            }
+            input:focus {
                 outline: none;
                 border-color: #667eea;
                 box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
-            }}
-            button {{
+            }
+            button {
                 width: 100%;
                 padding: 14px;
                 background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
@@ -179,43 +231,43 @@ async def index():
                 font-weight: 600;
                 cursor: pointer;
                 transition: all 0.3s;
-            }}
-            button:hover {{
+            }
+            button:hover {
                 transform: translateY(-2px);
                 box-shadow: 0 10px 20px rgba(102, 126, 234, 0.3);
-            }}
-            button:active {{
+            }
+            button:active {
                 transform: translateY(0);
-            }}
-            button:disabled {{
+            }
+            button:disabled {
                 opacity: 0.6;
                 cursor: not-allowed;
                 transform: none;
-            }}
-            .message {{
+            }
+            .message {
                 margin-top: 20px;
                 padding: 12px;
                 border-radius: 8px;
                 font-size: 14px;
                 display: none;
                 text-align: center;
-            }}
-            .message.success {{
+            }
+            .message.success {
                 background: #d4edda;
                 color: #155724;
                 border: 1px solid #c3e6cb;
-            }}
-            .message.error {{
+            }
+            .message.error {
                 background: #f8d7da;
                 color: #721c24;
                 border: 1px solid #f5c6cb;
-            }}
-            .loading {{
+            }
+            .loading {
                 display: none;
                 text-align: center;
                 margin-top: 20px;
-            }}
-            .spinner {{
+            }
+            .spinner {
                 border: 3px solid #f3f3f3;
                 border-top: 3px solid #667eea;
                 border-radius: 50%;
@@ -223,12 +275,12 @@ async def index():
                 height: 40px;
                 animation: spin 1s linear infinite;
                 margin: 0 auto 10px;
-            }}
-            @keyframes spin {{
-                0% {{ transform: rotate(0deg); }}
-                100% {{ transform: rotate(360deg); }}
-            }}
-            .info {{
+            }
+            @keyframes spin {
+                0% { transform: rotate(0deg); }
+                100% { transform: rotate(360deg); }
+            }
+            .info {
                 margin-top: 20px;
                 padding: 15px;
                 background: #e7f3ff;
@@ -236,7 +288,7 @@ async def index():
                 border-radius: 4px;
                 font-size: 12px;
                 color: #1976D2;
-            }}
+            }
         </style>
     </head>
     <body>
@@ -292,7 +344,7 @@ async def index():
             const loading = document.getElementById('loading');
             const message = document.getElementById('message');
             
-            form.addEventListener('submit', async (e) => {{
+            form.addEventListener('submit', async (e) => {
                 e.preventDefault();
                 
                 const email = document.getElementById('email').value;
@@ -303,47 +355,62 @@ async def index():
                 loading.style.display = 'block';
                 message.style.display = 'none';
                 
-                try {{
-                    const response = await fetch('/api/sso/login', {{
+                try {
+                    const response = await fetch('/api/sso/login', {
                         method: 'POST',
-                        headers: {{
+                        headers: {
                             'Content-Type': 'application/json',
-                        }},
-                        body: JSON.stringify({{ email, password }})
-                    }});
+                        },
+                        body: JSON.stringify({ email, password })
+                    });
                     
                     const data = await response.json();
                     
-                    if (response.ok && data.success) {{
+                    if (response.ok && data.success) {
                         showMessage('登录成功！正在跳转...', 'success');
                         
                         // 延迟跳转
-                        setTimeout(() => {{
+                        setTimeout(() => {
                             window.location.href = data.redirect_url;
-                        }}, 1000);
-                    }} else {{
+                        }, 1000);
+                    } else {
                         showMessage(data.message || '登录失败，请检查账号密码', 'error');
                         submitBtn.disabled = false;
-                    }}
-                }} catch (error) {{
+                    }
+                } catch (error) {
                     console.error('登录错误:', error);
                     showMessage('网络错误，请稍后重试', 'error');
                     submitBtn.disabled = false;
-                }} finally {{
+                } finally {
                     loading.style.display = 'none';
-                }}
-            }});
+                }
+            });
             
-            function showMessage(text, type) {{
+            function showMessage(text, type) {
                 message.textContent = text;
-                message.className = `message ${{type}}`;
+                message.className = `message ${type}`;
                 message.style.display = 'block';
-            }}
+            }
         </script>
     </body>
     </html>
     """
-    return HTMLResponse(content=html)
+
+INDEX_ETAG = f'"{hashlib.md5(INDEX_HTML.encode()).hexdigest()}"'
+_INDEX_HEADERS = {"Cache-Control": "public, max-age=300", "ETag": INDEX_ETAG}
+_INDEX_RESPONSE = HTMLResponse(content=INDEX_HTML, headers=_INDEX_HEADERS)
+
+
+# ============================================================================
+# API路由
+# ============================================================================
+
+@app.get("/", response_class=HTMLResponse)
+async def index(request: Request):
+    """首页 - 简单的登录表单（浏览器缓存未过期时返回 304）"""
+    if request.headers.get("if-none-match") == INDEX_ETAG:
+        return Response(status_code=304, headers=_INDEX_HEADERS)
+    return _INDEX_RESPONSE
 
 
 @app.post("/api/sso/login")
@@ -353,8 +420,13 @@ async def sso_login(request: LoginRequest):
     
     功能：调用Dify API获取token，生成跳转URL
     """
+    # 只拦截明显不是邮箱的输入，完整校验由Dify登录API完成
+    if "@" not in request.email:
+        raise HTTPException(status_code=400, detail="邮箱地址无效")
+    
     # 调用Dify登录API
-    token_data = call_dify_login_api(request.email, request.password)
+    async with _dify_sem:
+        token_data = await call_dify_login_api(request.email, request.password)
     
     if not token_data:
         raise HTTPException(
@@ -368,7 +440,7 @@ async def sso_login(request: LoginRequest):
     # 构造跳转URL（方式1：通过URL参数传递）
     redirect_url = f"{DIFY_WEB_URL}?sso_access_token={access_token}&sso_refresh_token={refresh_token}"
     
-    print(f"[{datetime.now()}] SSO登录成功: {request.email}")
+    logger.info("SSO登录成功: %s", request.email)
     
     return {
         "success": True,
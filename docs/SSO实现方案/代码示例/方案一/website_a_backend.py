@@ -6,7 +6,7 @@
 版本: v1.0.0
 
 使用说明:
-1. 安装依赖: pip install fastapi requests pydantic cryptography
+1. 安装依赖: pip install fastapi requests pydantic cryptography orjson
 2. 配置环境变量: DIFY_BASE_URL, DIFY_SSO_SECRET
 3. 运行服务: uvicorn website_a_backend:app --reload
 """
@@ -20,10 +20,13 @@ from typing import Optional
 from datetime import datetime, timedelta
 from urllib.parse import urlencode, quote
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from fastapi import FastAPI, HTTPException, Depends, Query
-from fastapi.responses import RedirectResponse
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import ORJSONResponse, RedirectResponse
+from pydantic import BaseModel
 from cryptography.fernet import Fernet
 
 # ============================================================================
@@ -32,10 +35,14 @@ from cryptography.fernet import Fernet
 
 DIFY_BASE_URL = os.getenv("DIFY_BASE_URL", "http://localhost:5001")
 DIFY_SSO_SECRET = os.getenv("DIFY_SSO_SECRET", "your-shared-secret-key")
-ENCRYPTION_KEY = Fernet.generate_key()  # 生产环境应从环境变量读取
-cipher_suite = Fernet(ENCRYPTION_KEY)
+# token加密密钥（Fernet格式）。未配置时临时生成，进程重启后已签发的SSO链接将失效
+SSO_FERNET_KEY = os.getenv("SSO_FERNET_KEY") or Fernet.generate_key().decode()
 
-app = FastAPI(title="Website A - SSO Integration", version="1.0.0")
+app = FastAPI(
+    title="Website A - SSO Integration",
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # JSON响应使用orjson序列化
+)
 
 # ============================================================================
 # 数据模型
@@ -43,7 +50,7 @@ app = FastAPI(title="Website A - SSO Integration", version="1.0.0")
 
 class SSORequest(BaseModel):
     """SSO请求模型"""
-    email: EmailStr
+    email: str
     password: str
     redirect_url: Optional[str] = None
 
@@ -59,12 +66,52 @@ class SSOResponse(BaseModel):
 # 核心SSO服务类
 # ============================================================================
 
+def _fast_email_ok(email: str) -> bool:
+    """
+    邮箱格式的快速检查
+    
+    只检查基本结构（本地部分@域名，长度符合 RFC 5321），不做正则匹配和 IDNA 处理；
+    账户是否存在以 Dify 端的查询为准。
+    """
+    local, sep, domain = email.rpartition("@")
+    return (
+        bool(sep)
+        and 1 <= len(local) <= 64
+        and 1 <= len(domain) <= 253
+        and "." in domain
+        and len(email) <= 254
+    )
+
+
 class DifySSO:
     """Dify单点登录服务类"""
     
-    def __init__(self, base_url: str, secret_key: str):
+    __slots__ = ("base_url", "secret_key", "_hmac_template", "_cipher", "session")
+    
+    def __init__(self, base_url: str, secret_key: str, fernet_key: str = SSO_FERNET_KEY):
         self.base_url = base_url.rstrip('/')
         self.secret_key = secret_key
+        # 预先完成密钥调度的HMAC模板，签名时复制后只需处理消息
+        self._hmac_template = hmac.new(secret_key.encode(), None, hashlib.sha256)
+        # 加密器只创建一次，各次请求复用
+        self._cipher = Fernet(fernet_key)
+        # 复用到Dify API的连接（keep-alive），避免每次登录重新握手
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=64,
+            # 只重试建立连接失败（请求尚未发出）；登录会创建会话，已发出的POST不重试
+            max_retries=Retry(
+                total=2,
+                connect=2,
+                read=0,
+                status=0,
+                other=0,
+                backoff_factor=0.2
+            )
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
     
     def get_dify_token(self, email: str, password: str) -> Optional[dict]:
         """
@@ -88,14 +135,21 @@ class DifySSO:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 login_url, 
                 json=payload, 
                 timeout=10,
                 headers={"Content-Type": "application/json"}
             )
             
-            data = response.json()
+            # 先看状态码，失败时不解析响应体
+            if response.status_code >= 400:
+                raise HTTPException(
+                    status_code=401,
+                    detail=f"Dify登录失败: HTTP {response.status_code}"
+                )
+            
+            data = orjson.loads(response.content)
             
             if data.get("result") == "success":
                 return data.get("data")
@@ -105,6 +159,9 @@ class DifySSO:
                 
         except requests.RequestException as e:
             raise HTTPException(status_code=500, detail=f"无法连接到Dify服务: {str(e)}")
+        except orjson.JSONDecodeError:
+            # 代理返回的HTML错误页等非JSON响应
+            raise HTTPException(status_code=502, detail="Dify服务返回了无效的响应")
     
     def generate_sso_url(self, access_token: str, refresh_token: str, 
                          redirect_path: str = "/") -> str:
@@ -119,12 +176,12 @@ class DifySSO:
         Returns:
             str: 完整的SSO跳转URL
         """
-        # 加密token以提高安全性
-        encrypted_access = cipher_suite.encrypt(access_token.encode()).decode()
-        encrypted_refresh = cipher_suite.encrypt(refresh_token.encode()).decode()
+        # 加密token以提高安全性（Fernet输出已是URL安全的base64，只需转为str）
+        encrypted_access = self._cipher.encrypt(access_token.encode("ascii")).decode("ascii")
+        encrypted_refresh = self._cipher.encrypt(refresh_token.encode("ascii")).decode("ascii")
         
         # 生成时间戳和签名
-        timestamp = int(time.time())
+        timestamp = time.time_ns() // 1_000_000_000
         signature = self._generate_signature(encrypted_access, timestamp)
         
         # 构造URL参数
@@ -151,13 +208,9 @@ class DifySSO:
         Returns:
             str: HMAC签名
         """
-        message = f"{token}:{timestamp}"
-        signature = hmac.new(
-            self.secret_key.encode(),
-            message.encode(),
-            hashlib.sha256
-        ).hexdigest()
-        return signature
+        h = self._hmac_template.copy()
+        h.update(f"{token}:{timestamp}".encode("ascii"))
+        return h.hexdigest()
 
 
 # ============================================================================
@@ -180,6 +233,9 @@ async def sso_login(request: SSORequest):
     Returns:
         SSOResponse: 包含跳转URL的响应
     """
+    if not _fast_email_ok(request.email):
+        raise HTTPException(status_code=400, detail="邮箱地址无效")
+    
     # 获取Dify token
     token_data = sso_service.get_dify_token(request.email, request.password)
     
@@ -16,12 +16,17 @@
 
 import hmac
 import hashlib
+import json
 import time
 from datetime import datetime, timedelta, UTC
+from functools import lru_cache
+from threading import Lock
 from typing import Optional
+from urllib.parse import quote
 
-from flask import request, redirect
-from flask_restful import Resource, reqparse
+from cachetools import TTLCache
+from flask import Response, request, redirect
+from flask_restful import Resource
 from werkzeug.exceptions import Unauthorized, BadRequest
 
 from configs import dify_config
@@ -33,6 +38,14 @@ from services.account_service import AccountService, TokenPair
 
 from .. import api
 
+# orjson 为可选依赖，未安装时使用标准库 json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
 
 # ============================================================================
 # 配置部分
@@ -41,98 +54,208 @@ from .. import api
 # SSO共享密钥，应与外部网站A保持一致
 SSO_SHARED_SECRET = dify_config.SSO_SHARED_SECRET if hasattr(dify_config, 'SSO_SHARED_SECRET') else "your-shared-secret-key"
 
+# 预先完成密钥调度的HMAC模板，验证签名时复制后只需处理消息
+_SSO_HMAC_TEMPLATE = hmac.new(SSO_SHARED_SECRET.encode(), None, hashlib.sha256)
+
+# 登录成功后跳转的前端回调地址（进程内不变，导入时生成）
+_FRONTEND_URL = dify_config.CONSOLE_WEB_URL or "http://localhost:3000"
+_REDIRECT_TEMPLATE = _FRONTEND_URL + "/sso-callback?access_token={a}&refresh_token={r}&redirect={p}"
+
 # SSO Token有效期（秒）
 SSO_TOKEN_VALIDITY = 300  # 5分钟
 
+# 邮箱 -> 账户ID 缓存，同一用户短时间内重复登录时免去按邮箱查询
+# 只缓存ID：账户本身每次通过主键加载，状态（如禁用）始终为最新；
+# 账户删除或邮箱变更后，命中的ID加载不到账户或邮箱不一致，会回退到按邮箱查询并更新缓存，
+# 因此不需要在账户变更处主动失效
+_email_to_account_id: TTLCache = TTLCache(maxsize=4096, ttl=30)
+_email_cache_lock = Lock()
+
 
 # ============================================================================
-# SSO服务类
+# SSO服务函数
 # ============================================================================
 
-class SSOService:
-    """SSO认证服务类"""
+def _fast_email_ok(email: str) -> bool:
+    """
+    邮箱格式的快速检查，在计算签名前排除明显无效的请求
     
-    @staticmethod
-    def verify_signature(email: str, timestamp: int, signature: str) -> bool:
-        """
-        验证SSO请求签名
-        
-        Args:
-            email: 用户邮箱
-            timestamp: 请求时间戳
-            signature: 请求签名
-            
-        Returns:
-            bool: 签名是否有效
-        """
-        # 检查时间戳有效性（防止重放攻击）
-        current_time = int(time.time())
-        if abs(current_time - timestamp) > SSO_TOKEN_VALIDITY:
-            return False
-        
-        # 生成期望的签名
-        message = f"{email}:{timestamp}"
-        expected_signature = hmac.new(
-            SSO_SHARED_SECRET.encode(),
-            message.encode(),
-            hashlib.sha256
-        ).hexdigest()
+    只检查本地部分@域名的结构和 RFC 5321 长度限制；账户是否存在以随后的数据库查询为准。
+    """
+    local, sep, domain = email.rpartition("@")
+    return (
+        bool(sep)
+        and 1 <= len(local) <= 64
+        and 1 <= len(domain) <= 253
+        and "." in domain
+        and len(email) <= 254
+    )
+
+
+def verify_signature(email: str, timestamp: int, signature: str) -> bool:
+    """
+    验证SSO请求签名
+    
+    Args:
+        email: 用户邮箱
+        timestamp: 请求时间戳
+        signature: 请求签名
         
-        # 使用恒定时间比较防止时序攻击
-        return hmac.compare_digest(signature, expected_signature)
+    Returns:
+        bool: 签名是否有效
+    """
+    # 先做廉价检查，过期、重放或格式不对的请求无需计算签名，也不进入缓存
+    # 检查时间戳有效性（防止重放攻击）；该检查与当前时间有关，不能缓存
+    current_time = time.time_ns() // 1_000_000_000
+    if abs(current_time - timestamp) > SSO_TOKEN_VALIDITY:
+        return False
+    
+    # SHA-256 签名的十六进制长度固定为64
+    if len(signature) != 64 or not _fast_email_ok(email):
+        return False
+    
+    return _verify_hmac(email, timestamp, signature)
+
+
+@lru_cache(maxsize=4096)
+def _verify_hmac(email: str, timestamp: int, signature: str) -> bool:
+    """
+    校验签名本身（按参数缓存）
+    
+    结果只取决于参数和共享密钥，浏览器重复提交、预取或重试时直接命中缓存。
+    过期的时间戳在调用前已被拒绝，旧条目随LRU淘汰。
+    """
+    # 签名为十六进制字符串，转为原始字节后比较，省去期望签名的十六进制编码
+    try:
+        provided = bytes.fromhex(signature)
+    except ValueError:
+        return False
+    
+    # 生成期望的签名
+    h = _SSO_HMAC_TEMPLATE.copy()
+    h.update(f"{email}:{timestamp}".encode())
+    expected = h.digest()
     
-    @staticmethod
-    def authenticate_user(email: str) -> Optional[Account]:
-        """
-        通过邮箱认证用户
+    # 使用恒定时间比较防止时序攻击
+    return hmac.compare_digest(provided, expected)
+
+
+def authenticate_user(email: str) -> Optional[Account]:
+    """
+    通过邮箱认证用户
+    
+    Args:
+        email: 用户邮箱
         
-        Args:
-            email: 用户邮箱
-            
-        Returns:
-            Account: 用户账户对象或None
-        """
+    Returns:
+        Account: 用户账户对象或None
+    """
+    with _email_cache_lock:
+        account_id = _email_to_account_id.get(email)
+    
+    # 命中缓存时按主键加载（优先使用会话的identity map）
+    account = db.session.get(Account, account_id) if account_id else None
+    if account is None or account.email != email:
         account = db.session.query(Account).filter_by(email=email).first()
-        
         if not account:
+            with _email_cache_lock:
+                _email_to_account_id.pop(email, None)
             return None
-        
-        if account.status == AccountStatus.BANNED.value:
-            raise Unauthorized("账户已被禁用")
-        
-        return account
+        with _email_cache_lock:
+            _email_to_account_id[email] = account.id
     
-    @staticmethod
-    def create_sso_token(account: Account) -> TokenPair:
-        """
-        为SSO用户创建token
-        
-        Args:
-            account: 用户账户对象
-            
-        Returns:
-            TokenPair: 访问令牌对
-        """
-        # 更新登录信息
-        ip_address = extract_remote_ip(request)
-        if ip_address:
-            AccountService.update_login_info(account=account, ip_address=ip_address)
-        
-        # 激活待激活账户
-        if account.status == AccountStatus.PENDING.value:
-            account.status = AccountStatus.ACTIVE.value
-            db.session.commit()
-        
-        # 生成token
-        token_pair = AccountService.login(account=account, ip_address=ip_address)
+    if account.status == AccountStatus.BANNED.value:
+        raise Unauthorized("账户已被禁用")
+    
+    return account
+
+
+def create_sso_token(account: Account) -> TokenPair:
+    """
+    为SSO用户创建token
+    
+    Args:
+        account: 用户账户对象
         
-        return token_pair
+    Returns:
+        TokenPair: 访问令牌对
+    """
+    # 更新登录信息
+    ip_address = extract_remote_ip(request)
+    if ip_address:
+        AccountService.update_login_info(account=account, ip_address=ip_address)
+    
+    # 激活待激活账户
+    if account.status == AccountStatus.PENDING.value:
+        account.status = AccountStatus.ACTIVE.value
+        db.session.commit()
+    
+    # 生成token
+    token_pair = AccountService.login(account=account, ip_address=ip_address)
+    
+    return token_pair
 
 
 # ============================================================================
 # API端点
 # ============================================================================
 
+def _json_response(payload: dict, status: int = 200) -> Response:
+    """
+    构建预先序列化的JSON响应
+    
+    直接返回 flask.Response，跳过 Flask-RESTful 的 output_json 再次序列化。
+    
+    Args:
+        payload: 响应数据
+        status: HTTP状态码
+        
+    Returns:
+        Response: JSON响应
+    """
+    if ORJSON_AVAILABLE:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    return Response(body, status=status, mimetype="application/json")
+
+
+def _parse_sso_params(source) -> dict:
+    """
+    从请求参数中取出SSO字段
+    
+    直接读取字典，不经过 reqparse 的逐字段解析。
+    
+    Args:
+        source: 查询参数（request.args）或JSON请求体
+        
+    Returns:
+        dict: email, timestamp, signature, redirect
+        
+    Raises:
+        BadRequest: 缺少必填字段、时间戳不是整数或跳转路径不是字符串
+    """
+    email = source.get('email')
+    signature = source.get('signature')
+    timestamp = source.get('timestamp')
+    if not email or not signature or timestamp is None:
+        raise BadRequest("缺少必填参数: email, timestamp, signature")
+    try:
+        timestamp = int(timestamp)
+    except (TypeError, ValueError):
+        raise BadRequest("timestamp 必须是整数")
+    redirect_path = source.get('redirect') or '/'
+    if not isinstance(redirect_path, str):
+        raise BadRequest("redirect 必须是字符串")
+    
+    return {
+        'email': str(email),
+        'timestamp': timestamp,
+        'signature': str(signature),
+        'redirect': redirect_path
+    }
+
+
 class SSOLoginApi(Resource):
     """
     SSO登录API端点
@@ -152,60 +275,57 @@ class SSOLoginApi(Resource):
     
     def get(self):
         """处理SSO GET请求"""
-        parser = reqparse.RequestParser()
-        parser.add_argument('email', type=str, required=True, location='args')
-        parser.add_argument('timestamp', type=int, required=True, location='args')
-        parser.add_argument('signature', type=str, required=True, location='args')
-        parser.add_argument('redirect', type=str, required=False, location='args', default='/')
-        args = parser.parse_args()
+        args = _parse_sso_params(request.args)
         
         # 验证签名
-        if not SSOService.verify_signature(args['email'], args['timestamp'], args['signature']):
+        if not verify_signature(args['email'], args['timestamp'], args['signature']):
             raise Unauthorized("SSO签名验证失败")
         
         # 认证用户
-        account = SSOService.authenticate_user(args['email'])
+        account = authenticate_user(args['email'])
         if not account:
             raise Unauthorized("用户不存在")
         
         # 生成token
-        token_pair = SSOService.create_sso_token(account)
+        token_pair = create_sso_token(account)
         
         # 构造重定向URL，将token传递给前端
-        frontend_url = dify_config.CONSOLE_WEB_URL or "http://localhost:3000"
-        redirect_url = f"{frontend_url}/sso-callback?access_token={token_pair.access_token}&refresh_token={token_pair.refresh_token}&redirect={args['redirect']}"
+        # 跳转路径需转义，否则其中的 & 等字符会破坏查询参数
+        redirect_url = _REDIRECT_TEMPLATE.format(
+            a=token_pair.access_token,
+            r=token_pair.refresh_token,
+            p=quote(args['redirect'])
+        )
         
         return redirect(redirect_url, code=302)
     
     def post(self):
         """处理SSO POST请求"""
-        parser = reqparse.RequestParser()
-        parser.add_argument('email', type=str, required=True, location='json')
-        parser.add_argument('timestamp', type=int, required=True, location='json')
-        parser.add_argument('signature', type=str, required=True, location='json')
-        parser.add_argument('redirect', type=str, required=False, location='json', default='/')
-        args = parser.parse_args()
+        body = request.get_json(silent=True, cache=True)
+        if not isinstance(body, dict):
+            raise BadRequest("请求体必须是JSON对象")
+        args = _parse_sso_params(body)
         
         # 验证签名
-        if not SSOService.verify_signature(args['email'], args['timestamp'], args['signature']):
-            return {"result": "fail", "message": "SSO签名验证失败"}, 401
+        if not verify_signature(args['email'], args['timestamp'], args['signature']):
+            return _json_response({"result": "fail", "message": "SSO签名验证失败"}, 401)
         
         # 认证用户
-        account = SSOService.authenticate_user(args['email'])
+        account = authenticate_user(args['email'])
         if not account:
-            return {"result": "fail", "message": "用户不存在"}, 401
+            return _json_response({"result": "fail", "message": "用户不存在"}, 401)
         
         # 生成token
-        token_pair = SSOService.create_sso_token(account)
+        token_pair = create_sso_token(account)
         
-        return {
+        return _json_response({
             "result": "success",
             "data": {
                 "access_token": token_pair.access_token,
                 "refresh_token": token_pair.refresh_token,
                 "redirect": args['redirect']
             }
-        }
+        })
 
 
 # 注册API路由
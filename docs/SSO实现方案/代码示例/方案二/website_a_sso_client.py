@@ -6,22 +6,29 @@
 版本: v1.0.0
 
 使用说明:
-1. 安装依赖: pip install fastapi requests pydantic
+1. 安装依赖: pip install fastapi httpx orjson cachetools
 2. 配置环境变量: DIFY_BASE_URL, SSO_SHARED_SECRET
 3. 运行服务: uvicorn website_a_sso_client:app --reload
+4. 生产部署: pip install uvloop httptools 后使用 C 实现的事件循环和 HTTP 解析器，
+   按 CPU 核数启动多个 worker，并关闭访问日志:
+   uvicorn website_a_sso_client:app --host 0.0.0.0 --port 8000 \
+       --loop uvloop --http httptools --workers $(nproc) --no-access-log
 """
 
 import os
 import hmac
 import hashlib
 import time
+import importlib.util
+from contextlib import asynccontextmanager
 from typing import Optional
-from urllib.parse import urlencode
+from urllib.parse import quote, quote_plus
 
-import requests
+import httpx
+import orjson
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import RedirectResponse, HTMLResponse
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import ORJSONResponse, RedirectResponse, HTMLResponse
 
 # ============================================================================
 # 配置部分
@@ -30,30 +37,46 @@ from pydantic import BaseModel, EmailStr
 DIFY_BASE_URL = os.getenv("DIFY_BASE_URL", "http://localhost:5001")
 SSO_SHARED_SECRET = os.getenv("SSO_SHARED_SECRET", "your-shared-secret-key")
 
-app = FastAPI(title="Website A - SSO Client (方案二)", version="1.0.0")
+# 登录成功后跳转的前端回调地址（假设前端与API同域，导入时生成）
+_FRONTEND_URL = DIFY_BASE_URL.replace('/api', '')
+_CALLBACK_TEMPLATE = _FRONTEND_URL + "/sso-callback?access_token={a}&refresh_token={r}&redirect={p}"
+
+# 安装 h2 后启用 HTTP/2，多个并发请求复用同一连接
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
 
-# ============================================================================
-# 数据模型
-# ============================================================================
 
-class SSOLoginRequest(BaseModel):
-    """SSO登录请求模型"""
-    email: EmailStr
-    redirect_path: Optional[str] = "/"
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建SSO客户端的连接池，关闭时释放"""
+    await sso_client.start()
+    try:
+        yield
+    finally:
+        await sso_client.close()
 
 
+app = FastAPI(
+    title="Website A - SSO Client (方案二)",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # JSON响应使用orjson序列化
+)
+
 # ============================================================================
 # SSO客户端服务类
 # ============================================================================
 
-class DifySSOClient:
-    """Dify SSO客户端服务类"""
-    
-    def __init__(self, base_url: str, shared_secret: str):
-        self.base_url = base_url.rstrip('/')
-        self.shared_secret = shared_secret
+def _make_signer(template: "hmac.HMAC"):
+    """
+    构建SSO请求签名函数（GET跳转和POST登录共用）
     
-    def generate_sso_signature(self, email: str, timestamp: int) -> str:
+    Args:
+        template: 已完成密钥调度的HMAC模板
+        
+    Returns:
+        Callable[[str, int], str]: generate_sso_signature(email, timestamp)
+    """
+    def generate_sso_signature(email: str, timestamp: int) -> str:
         """
         生成SSO请求签名
         
@@ -64,15 +87,27 @@ class DifySSOClient:
         Returns:
             str: HMAC-SHA256签名
         """
-        message = f"{email}:{timestamp}"
-        signature = hmac.new(
-            self.shared_secret.encode(),
-            message.encode(),
-            hashlib.sha256
-        ).hexdigest()
-        return signature
+        h = template.copy()
+        h.update(b"%s:%d" % (email.encode(), timestamp))
+        return h.hexdigest()
+    
+    return generate_sso_signature
+
+
+def _make_url_builder(endpoint: str, sign):
+    """
+    构建SSO登录URL生成函数
     
-    def generate_sso_url(self, email: str, redirect_path: str = "/") -> str:
+    端点和签名函数在构建时绑定为闭包变量，生成URL时不再逐次查找实例属性。
+    
+    Args:
+        endpoint: GET方式的SSO登录地址
+        sign: _make_signer 返回的签名函数
+        
+    Returns:
+        Callable[[str, str], str]: generate_sso_url(email, redirect_path="/")
+    """
+    def generate_sso_url(email: str, redirect_path: str = "/") -> str:
         """
         生成SSO登录URL
         
@@ -83,22 +118,59 @@ class DifySSOClient:
         Returns:
             str: 完整的SSO登录URL
         """
-        timestamp = int(time.time())
-        signature = self.generate_sso_signature(email, timestamp)
-        
-        params = {
-            "email": email,
-            "timestamp": timestamp,
-            "signature": signature,
-            "redirect": redirect_path
-        }
+        timestamp = time.time_ns() // 1_000_000_000
         
-        sso_url = f"{self.base_url}/console/api/sso/login?{urlencode(params)}"
-        return sso_url
+        # 参数固定为四个，直接拼接（签名为十六进制、时间戳为整数，无需转义）
+        return (
+            f"{endpoint}?email={quote_plus(email)}&timestamp={timestamp}"
+            f"&signature={sign(email, timestamp)}&redirect={quote_plus(redirect_path)}"
+        )
+    
+    return generate_sso_url
+
+
+class DifySSOClient:
+    """Dify SSO客户端服务类"""
+    
+    def __init__(self, base_url: str, shared_secret: str):
+        self.base_url = base_url.rstrip('/')
+        self.shared_secret = shared_secret
+        # GET方式的SSO登录地址
+        self._sso_endpoint = f"{self.base_url}/console/api/sso/login"
+        # 预先完成密钥调度的HMAC模板，签名时复制后只需处理消息
+        self._hmac_template = hmac.new(shared_secret.encode(), None, hashlib.sha256)
+        # 签名和URL生成（闭包，端点与HMAC模板已绑定为自由变量）
+        self.generate_sso_signature = _make_signer(self._hmac_template)
+        self.generate_sso_url = _make_url_builder(self._sso_endpoint, self.generate_sso_signature)
+        # 异步连接池，在 start() 中创建（见 lifespan）
+        self.client: Optional[httpx.AsyncClient] = None
+    
+    async def start(self) -> None:
+        """创建共享的异步HTTP客户端，复用到Dify API的连接（keep-alive）"""
+        if self.client is not None:
+            return
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Content-Type": "application/json"},
+            # 连接超时与读取超时分开设置，连接不上时尽快失败
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            # 连接失败时自动重试
+            transport=httpx.AsyncHTTPTransport(
+                retries=2,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+            )
+        )
     
-    def sso_login_post(self, email: str, redirect_path: str = "/") -> dict:
+    async def close(self) -> None:
+        """关闭HTTP客户端"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+    
+    async def sso_login_post(self, email: str, redirect_path: str = "/") -> dict:
         """
-        通过POST方式进行SSO登录
+        通过POST方式进行SSO登录（异步，等待期间不阻塞其他请求）
         
         Args:
             email: 用户邮箱
@@ -110,11 +182,9 @@ class DifySSOClient:
         Raises:
             HTTPException: 当SSO登录失败时
         """
-        timestamp = int(time.time())
+        timestamp = time.time_ns() // 1_000_000_000
         signature = self.generate_sso_signature(email, timestamp)
         
-        sso_url = f"{self.base_url}/console/api/sso/login"
-        
         payload = {
             "email": email,
             "timestamp": timestamp,
@@ -123,14 +193,12 @@ class DifySSOClient:
         }
         
         try:
-            response = requests.post(
-                sso_url,
-                json=payload,
-                timeout=10,
-                headers={"Content-Type": "application/json"}
+            response = await self.client.post(
+                "/console/api/sso/login",
+                content=orjson.dumps(payload)
             )
             
-            data = response.json()
+            data = orjson.loads(response.content)
             
             if data.get("result") == "success":
                 return data.get("data")
@@ -140,25 +208,24 @@ class DifySSOClient:
                     detail=f"SSO登录失败: {data.get('message', 'Unknown error')}"
                 )
                 
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"无法连接到Dify服务: {str(e)}"
             )
+        except orjson.JSONDecodeError:
+            # 代理返回的HTML错误页等非JSON响应
+            raise HTTPException(
+                status_code=502,
+                detail="Dify服务返回了无效的响应"
+            )
 
 
 # ============================================================================
-# API路由
+# 登录页面 - 内容固定，导入时生成一次，所有请求复用同一个响应
 # ============================================================================
 
-# 初始化SSO客户端
-sso_client = DifySSOClient(DIFY_BASE_URL, SSO_SHARED_SECRET)
-
-
-@app.get("/", response_class=HTMLResponse)
-async def index():
-    """首页 - SSO登录表单"""
-    html_content = """
+INDEX_HTML = """
     <!DOCTYPE html>
     <html lang="zh-CN">
     <head>
@@ -249,7 +316,29 @@ async def index():
     </body>
     </html>
     """
-    return HTMLResponse(content=html_content)
+
+_INDEX_RESPONSE = HTMLResponse(content=INDEX_HTML)
+
+
+# ============================================================================
+# API路由
+# ============================================================================
+
+# 初始化SSO客户端
+sso_client = DifySSOClient(DIFY_BASE_URL, SSO_SHARED_SECRET)
+
+# 最近签发的SSO跳转地址：(email, redirect) -> URL
+# 浏览器预取等1秒内的重复请求直接复用（时间戳为秒级，签名仍然有效）
+_recent_sso_urls: TTLCache = TTLCache(maxsize=1024, ttl=1.0)
+
+# 跳转地址带有时效签名，禁止浏览器和中间代理缓存
+_NO_STORE_HEADERS = {"Cache-Control": "no-store, private", "Vary": "Cookie"}
+
+
+@app.get("/", response_class=HTMLResponse)
+async def index():
+    """首页 - SSO登录表单"""
+    return _INDEX_RESPONSE
 
 
 @app.get("/sso/redirect")
@@ -266,35 +355,60 @@ async def sso_redirect(email: str, redirect: str = "/"):
     Returns:
         RedirectResponse: 重定向到Dify SSO端点
     """
-    sso_url = sso_client.generate_sso_url(email, redirect)
-    return RedirectResponse(url=sso_url, status_code=302)
+    key = (email, redirect)
+    sso_url = _recent_sso_urls.get(key)
+    if sso_url is None:
+        sso_url = sso_client.generate_sso_url(email, redirect)
+        _recent_sso_urls[key] = sso_url
+    return RedirectResponse(url=sso_url, status_code=302, headers=_NO_STORE_HEADERS)
 
 
 @app.post("/sso/login")
-async def sso_login(request: SSOLoginRequest):
+async def sso_login(request: Request):
     """
     SSO登录端点 (POST方式)
     
     功能描述: 调用Dify SSO API获取token，返回前端跳转URL
     
+    直接用orjson解析请求体，不经过Pydantic模型校验；
+    邮箱格式和账户是否存在由Dify端确认。
+    
     Args:
-        request: SSO登录请求
+        request: 请求对象，JSON体包含 email 和可选的 redirect_path
         
     Returns:
-        dict: 包含跳转URL的响应
+        ORJSONResponse: 包含跳转URL的响应
     """
-    token_data = sso_client.sso_login_post(
-        email=request.email,
-        redirect_path=request.redirect_path
+    try:
+        data = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="请求体不是有效的JSON")
+    
+    email = data.get("email") if isinstance(data, dict) else None
+    # 只拦截明显不是邮箱的输入，结构检查由Dify端在校验签名前完成
+    if not isinstance(email, str) or "@" not in email:
+        raise HTTPException(status_code=400, detail="邮箱地址无效")
+    redirect_path = data.get("redirect_path") or "/"
+    if not isinstance(redirect_path, str):
+        raise HTTPException(status_code=400, detail="跳转路径无效")
+    
+    token_data = await sso_client.sso_login_post(
+        email=email,
+        redirect_path=redirect_path
     )
     
     # 构造前端回调URL
-    frontend_url = DIFY_BASE_URL.replace('/api', '')  # 假设前端与API同域
-    callback_url = f"{frontend_url}/sso-callback?access_token={token_data['access_token']}&refresh_token={token_data['refresh_token']}&redirect={token_data['redirect']}"
+    # 跳转路径需转义，否则其中的 & 等字符会破坏查询参数
+    callback_url = _CALLBACK_TEMPLATE.format(
+        a=token_data['access_token'],
+        r=token_data['refresh_token'],
+        p=quote(token_data['redirect'])
+    )
     
-    return {
+    # 直接返回响应对象，跳过 jsonable_encoder 的逐字段转换
+    return ORJSONResponse({
         "success": True,
         "redirect_url": callback_url,
         "message": "SSO登录成功"
-    }
+    })
 